@@ -0,0 +1,130 @@
+import hashlib
+import hmac
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger("obstracts_web.api")
+
+VERIFIED_API_KEY_CACHE_KEY = 'api.verified_key'
+API_KEY_LAST_USED_KEY = 'api.last_used'
+
+
+@dataclass
+class VerifiedApiKey:
+    """
+    What a request needs to know about a TeamApiKey once the presented key has been verified.
+    """
+
+    id: str
+    prefix: str
+    digest: str
+    team_id: str
+    membership_id: int
+    user_id: int
+    status: str
+    expiry_date: Optional[datetime] = None
+
+    @property
+    def has_expired(self) -> bool:
+        return self.expiry_date is not None and self.expiry_date < timezone.now()
+
+
+def _get_key_digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _get_verified_api_key_cache_key(prefix):
+    return f'{VERIFIED_API_KEY_CACHE_KEY}:{prefix}'
+
+
+def get_verified_api_key(key) -> Optional[VerifiedApiKey]:
+    """
+    The cached VerifiedApiKey for `key`, None unless `key` is the exact key that was verified.
+    """
+    prefix, _, _ = key.partition('.')
+    verified_key = cache.get(_get_verified_api_key_cache_key(prefix))
+    if verified_key is None or not hmac.compare_digest(verified_key.digest, _get_key_digest(key)):
+        return None
+    return verified_key
+
+
+def save_verified_api_key(key, team_api_key) -> VerifiedApiKey:
+    verified_key = VerifiedApiKey(
+        id=team_api_key.id,
+        prefix=team_api_key.prefix,
+        digest=_get_key_digest(key),
+        team_id=str(team_api_key.team_id),
+        membership_id=team_api_key.membership_id,
+        user_id=team_api_key.user_id,
+        status=team_api_key.status,
+        expiry_date=team_api_key.expiry_date,
+    )
+    cache.set(
+        _get_verified_api_key_cache_key(verified_key.prefix),
+        verified_key,
+        timeout=settings.API_KEY_CACHE_TIMEOUT,
+    )
+    return verified_key
+
+
+def invalidate_verified_api_keys(prefixes):
+    prefixes = list(prefixes)
+    if prefixes:
+        cache.delete_many([_get_verified_api_key_cache_key(prefix) for prefix in prefixes])
+
+
+# keys recorded by this process in the current minute, so a busy key costs one redis write a minute.
+# Only the current minute is kept, the set does not grow with every key ever used.
+_last_used_minute = None
+_last_used_recorded = set()
+
+
+def record_api_key_used(key_id):
+    """
+    Remember that the key was used, flushed to TeamApiKey.last_used by `flush_api_key_last_used`.
+    """
+    global _last_used_minute
+    minute = int(time.time()) // 60 * 60
+    if minute != _last_used_minute:
+        _last_used_recorded.clear()
+        _last_used_minute = minute
+    if key_id in _last_used_recorded:
+        return
+    try:
+        get_redis_connection('default').hset(API_KEY_LAST_USED_KEY, key_id, minute)
+    except Exception:
+        logger.exception("Could not record API key usage")
+        return
+    _last_used_recorded.add(key_id)
+
+
+def pop_api_keys_last_used() -> dict:
+    """
+    Takes the recorded usage out of redis, returns a dict of key id to last used datetime.
+    """
+    connection = get_redis_connection('default')
+    # renamed first so keys used while flushing are kept for the next flush
+    flushing_key = f'{API_KEY_LAST_USED_KEY}:flushing:{uuid.uuid4()}'
+    try:
+        connection.rename(API_KEY_LAST_USED_KEY, flushing_key)
+    except ResponseError:
+        # nothing was recorded since the last flush
+        return {}
+    pipeline = connection.pipeline()
+    pipeline.hgetall(flushing_key)
+    pipeline.delete(flushing_key)
+    recorded, _ = pipeline.execute()
+    return {
+        key_id.decode(): datetime.fromtimestamp(int(timestamp), tz=dt_timezone.utc)
+        for key_id, timestamp in recorded.items()
+    }
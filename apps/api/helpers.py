@@ -1,11 +1,15 @@
+from dataclasses import dataclass
 from typing import Optional
-from django.utils import timezone
+from django.utils.functional import cached_property
 from django.http import HttpRequest
 from rest_framework_api_key.permissions import KeyParser
 from rest_framework.exceptions import PermissionDenied
 
+from apps.api.cache import VerifiedApiKey, get_verified_api_key, record_api_key_used, save_verified_api_key
 from apps.api.models import UserAPIKey, TeamApiKey, TeamApiKeyStatus
+from apps.teams.models import Membership, Team
 from apps.users.models import CustomUser
+from apps.utils.request_cache import get_request_cached
 
 
 def get_user_from_request(request: HttpRequest) -> Optional[CustomUser]:
@@ -17,15 +21,76 @@ def get_user_from_request(request: HttpRequest) -> Optional[CustomUser]:
     else:
         return request.user
 
+
 def get_team_from_request(request: HttpRequest):
     if request is None:
         return None
-    team_api_key = _get_api_key_object(request, TeamApiKey)
-    if team_api_key.status != TeamApiKeyStatus.ACTIVE:
+    context = get_team_api_key_context(request)
+    if context.api_key is None or context.api_key.status != TeamApiKeyStatus.ACTIVE:
         raise PermissionDenied("Invalid key")
-    team_api_key.last_used = timezone.now()
-    team_api_key.save()
-    return team_api_key.team
+    if not context.last_used_recorded:
+        # written to the database in bulk by apps.api.tasks.flush_api_key_last_used
+        record_api_key_used(context.api_key.id)
+        context.last_used_recorded = True
+    return context.team
+
+
+def get_verified_team_api_key(request: HttpRequest) -> Optional[VerifiedApiKey]:
+    return get_team_api_key_context(request).api_key
+
+
+@dataclass
+class TeamApiKeyContext:
+    """
+    The TeamApiKey presented with a request, resolved once and shared by the permission classes
+    and helpers that look at it during the request.
+    """
+
+    api_key: Optional[VerifiedApiKey]
+    last_used_recorded: bool = False
+
+    @cached_property
+    def team(self) -> Optional[Team]:
+        if self.api_key is None:
+            return None
+        return Team.objects.get(id=self.api_key.team_id)
+
+    @cached_property
+    def membership(self) -> Optional[Membership]:
+        if self.api_key is None:
+            return None
+        return Membership.objects.get(id=self.api_key.membership_id)
+
+
+def get_team_api_key_context(request: HttpRequest) -> TeamApiKeyContext:
+    return get_request_cached(
+        request,
+        "team_api_key_context",
+        lambda: TeamApiKeyContext(api_key=_verify_team_api_key(request)),
+    )
+
+
+def _verify_team_api_key(request) -> Optional[VerifiedApiKey]:
+    """
+    Verifies the TeamApiKey presented with the request, returns None when it is not a valid key.
+
+    Hashing the key to verify it is slow on purpose, so verified keys are cached for
+    API_KEY_CACHE_TIMEOUT seconds. Saving, deleting or blocking a key removes it from the cache.
+    """
+    key = _get_api_key(request)
+    if not key:
+        return None
+    verified_key = get_verified_api_key(key)
+    if verified_key is None:
+        try:
+            team_api_key = TeamApiKey.objects.get_from_key(key)
+        except TeamApiKey.DoesNotExist:
+            return None
+        verified_key = save_verified_api_key(key, team_api_key)
+    if verified_key.has_expired:
+        return None
+    return verified_key
+
 
 def _get_api_key_object(request, model_class):
     return model_class.objects.get_from_key(_get_api_key(request))
@@ -4,8 +4,8 @@ from django.http import HttpRequest
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_api_key.permissions import BaseHasAPIKey
 
-from apps.obstracts_api.models import FeedSubsription
-from .helpers import get_user_from_request, get_team_from_request
+from apps.obstracts_api.subscription_index import is_team_subscribed
+from .helpers import get_user_from_request, get_team_from_request, get_verified_team_api_key
 from .models import UserAPIKey, TeamApiKey
 
 
@@ -24,15 +24,14 @@ class HasTeamFeedApiKey(BaseHasAPIKey):
     model = TeamApiKey
 
     def has_permission(self, request: HttpRequest, view: typing.Any) -> bool:
-        has_perm = super().has_permission(request, view)
+        has_perm = get_verified_team_api_key(request) is not None
         if has_perm:
             feed_id = view.kwargs.get('feed_id')
             team = get_team_from_request(request)
             request.team = team
-            feed_subscription = FeedSubsription.objects.filter(feed_id=feed_id, team_id=team.id).select_related('feed').first()
-            if not feed_subscription:
+            if not is_team_subscribed(team.id, feed_id):
                 return False
-            view.feed_id = feed_subscription.feed_id
+            view.feed_id = feed_id
             return True
         return has_perm
 
@@ -40,7 +39,7 @@ class HasTeamApiKey(BaseHasAPIKey):
     model = TeamApiKey
 
     def has_permission(self, request: HttpRequest, view: typing.Any) -> bool:
-        has_perm = super().has_permission(request, view)
+        has_perm = get_verified_team_api_key(request) is not None
         if has_perm:
             team = get_team_from_request(request)
             view.team = team
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_verified_api_keys
+from .models import TeamApiKey
+
+
+@receiver(post_save, sender=TeamApiKey)
+@receiver(post_delete, sender=TeamApiKey)
+def team_api_key_changed(sender, instance, **kwargs):
+    # revoked, blocked or deleted keys must not keep authenticating from the cache. Dropped once the
+    # change is committed, a request verifying the key before then would cache the old row again.
+    transaction.on_commit(lambda: invalidate_verified_api_keys([instance.prefix]))
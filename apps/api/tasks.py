@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from .cache import pop_api_keys_last_used
+from .models import TeamApiKey
+
+
+@shared_task()
+def flush_api_key_last_used():
+    last_used = pop_api_keys_last_used()
+    if not last_used:
+        return
+    team_api_keys = list(TeamApiKey.objects.filter(id__in=last_used.keys()).only('id', 'last_used'))
+    for team_api_key in team_api_keys:
+        team_api_key.last_used = last_used[team_api_key.id]
+    # bulk_update sends no post_save, the keys stay in the verified key cache
+    TeamApiKey.objects.bulk_update(team_api_keys, ['last_used'], batch_size=500)
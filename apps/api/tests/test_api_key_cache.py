@@ -0,0 +1,75 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps.api.cache import get_verified_api_key, invalidate_verified_api_keys, save_verified_api_key
+from apps.api.models import TeamApiKey, TeamApiKeyStatus
+from apps.teams.models import Membership, Team
+from apps.teams.receivers import block_team_api_keys
+from apps.teams.roles import ROLE_OWNER
+from apps.users.models import CustomUser
+
+
+@override_settings(
+    API_KEY_CACHE_TIMEOUT=60,
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class VerifiedApiKeyCacheTest(SimpleTestCase):
+    key = "abcd1234.secret"
+
+    def setUp(self):
+        self.team_api_key = SimpleNamespace(
+            id="abcd1234.hashed",
+            prefix="abcd1234",
+            team_id="team-id",
+            membership_id=1,
+            user_id=1,
+            status="active",
+            expiry_date=None,
+        )
+
+    def test_only_the_verified_key_is_returned(self):
+        save_verified_api_key(self.key, self.team_api_key)
+        self.assertEqual(get_verified_api_key(self.key).team_id, "team-id")
+        self.assertIsNone(get_verified_api_key("abcd1234.guess"))
+
+    def test_invalidate(self):
+        save_verified_api_key(self.key, self.team_api_key)
+        invalidate_verified_api_keys(["abcd1234"])
+        self.assertIsNone(get_verified_api_key(self.key))
+
+    def test_expiry(self):
+        self.team_api_key.expiry_date = timezone.now() - timedelta(minutes=1)
+        self.assertTrue(save_verified_api_key(self.key, self.team_api_key).has_expired)
+
+
+@override_settings(
+    API_KEY_CACHE_TIMEOUT=60,
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class VerifiedApiKeyInvalidationTest(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create(username="user@example.com", email="user@example.com")
+        self.team = Team.objects.create(name="Team", slug="team")
+        # members.add() skips the Membership post_save that updates Auth0
+        self.team.members.add(user, through_defaults={"role": ROLE_OWNER})
+        membership = Membership.objects.get(team=self.team, user=user)
+        self.team_api_key, self.key = TeamApiKey.objects.create_key(
+            name="key", user=user, team=self.team, membership=membership
+        )
+        save_verified_api_key(self.key, self.team_api_key)
+
+    def test_saved_key_is_dropped_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team_api_key.status = TeamApiKeyStatus.BLOCKED
+            self.team_api_key.save()
+            self.assertIsNotNone(get_verified_api_key(self.key))
+        self.assertIsNone(get_verified_api_key(self.key))
+
+    def test_blocked_keys_are_dropped_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            block_team_api_keys(TeamApiKey.objects.filter(team=self.team))
+            self.assertIsNotNone(get_verified_api_key(self.key))
+        self.assertIsNone(get_verified_api_key(self.key))
@@ -0,0 +1,17 @@
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+from rest_framework.request import Request
+
+from apps.api.helpers import get_team_api_key_context, get_verified_team_api_key
+
+
+class TeamApiKeyContextTest(SimpleTestCase):
+    @mock.patch("apps.api.helpers._verify_team_api_key", return_value=None)
+    def test_key_is_verified_once_per_request(self, verify_team_api_key):
+        http_request = RequestFactory().get("/", HTTP_API_KEY="abcd1234.secret")
+        context = get_team_api_key_context(Request(http_request))
+        # DRF wraps the django request again in every view it passes through
+        self.assertIs(get_team_api_key_context(Request(http_request)), context)
+        self.assertIsNone(get_verified_team_api_key(http_request))
+        verify_team_api_key.assert_called_once()
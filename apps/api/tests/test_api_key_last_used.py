@@ -0,0 +1,48 @@
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+from django.test import TestCase
+from django_redis import get_redis_connection
+
+from apps.api import cache as api_cache
+from apps.api.models import TeamApiKey
+from apps.api.tasks import flush_api_key_last_used
+from apps.teams.models import Membership, Team
+from apps.teams.roles import ROLE_MEMBER
+from apps.users.models import CustomUser
+
+
+class ApiKeyLastUsedTest(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create(username="user@example.com", email="user@example.com")
+        team = Team.objects.create(name="Team", slug="team")
+        # members.add() skips the Membership post_save that updates Auth0
+        team.members.add(user, through_defaults={"role": ROLE_MEMBER})
+        membership = Membership.objects.get(team=team, user=user)
+        self.api_key, _ = TeamApiKey.objects.create_key(name="key", user=user, team=team, membership=membership)
+        get_redis_connection("default").delete(api_cache.API_KEY_LAST_USED_KEY)
+        api_cache._last_used_recorded.clear()
+
+    def test_usage_is_recorded_once_a_minute_and_flushed(self):
+        with mock.patch("apps.api.cache.get_redis_connection", wraps=get_redis_connection) as connection:
+            with mock.patch("apps.api.cache.time.time", return_value=1_700_000_010):
+                api_cache.record_api_key_used(self.api_key.id)
+                api_cache.record_api_key_used(self.api_key.id)
+            self.assertEqual(connection.call_count, 1)
+
+            with mock.patch("apps.api.cache.time.time", return_value=1_700_000_070):
+                api_cache.record_api_key_used(self.api_key.id)
+            self.assertEqual(connection.call_count, 2)
+
+        flush_api_key_last_used()
+        self.api_key.refresh_from_db()
+        self.assertEqual(self.api_key.last_used, datetime.fromtimestamp(1_700_000_040, tz=dt_timezone.utc))
+        # nothing is left for the next flush
+        self.assertEqual(api_cache.pop_api_keys_last_used(), {})
+
+    def test_only_the_current_minute_is_remembered(self):
+        with mock.patch("apps.api.cache.time.time", return_value=1_700_000_010):
+            api_cache.record_api_key_used("old-key")
+        with mock.patch("apps.api.cache.time.time", return_value=1_700_000_070):
+            api_cache.record_api_key_used(self.api_key.id)
+        self.assertEqual(api_cache._last_used_recorded, {self.api_key.id})
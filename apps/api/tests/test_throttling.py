@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, override_settings
+
+from apps.api.throttling import TeamRateThrottle
+
+
+@override_settings(API_RATE_LIMIT_PER_MINUTE=60)
+class TeamRateThrottleTest(SimpleTestCase):
+    def get_request(self, user=None, team=None):
+        request = SimpleNamespace(user=user or AnonymousUser())
+        if team:
+            request.team = team
+        return request
+
+    @mock.patch("apps.api.throttling.take_token")
+    def test_anonymous_requests_are_not_limited(self, take_token):
+        self.assertTrue(TeamRateThrottle().allow_request(self.get_request(), None))
+        take_token.assert_not_called()
+
+    @mock.patch("apps.api.throttling.get_team_rate_limit", return_value=120)
+    @mock.patch("apps.api.throttling.take_token", return_value=(True, 119.0))
+    def test_team_bucket(self, take_token, _get_team_rate_limit):
+        throttle = TeamRateThrottle()
+        request = self.get_request(team=SimpleNamespace(id="team-id"))
+        self.assertTrue(throttle.allow_request(request, None))
+        take_token.assert_called_once_with("api.rate_limit:team:team-id", 120, 2)
+        self.assertEqual(
+            throttle.get_headers(),
+            {"RateLimit-Limit": "120", "RateLimit-Remaining": "119", "RateLimit-Reset": "1"},
+        )
+        self.assertIs(request.rate_limit, throttle)
+
+    @mock.patch("apps.api.throttling.take_token", return_value=(False, 0.5))
+    def test_limited_user(self, _take_token):
+        throttle = TeamRateThrottle()
+        user = SimpleNamespace(pk=1, is_authenticated=True)
+        self.assertFalse(throttle.allow_request(self.get_request(user=user), None))
+        self.assertEqual(throttle.wait(), 1)
+
+    @mock.patch("apps.api.throttling.take_token", side_effect=ConnectionError)
+    def test_redis_errors_let_requests_through(self, _take_token):
+        user = SimpleNamespace(pk=1, is_authenticated=True)
+        self.assertTrue(TeamRateThrottle().allow_request(self.get_request(user=user), None))
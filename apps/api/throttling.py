@@ -0,0 +1,118 @@
+import logging
+import math
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger("obstracts_web.api")
+
+RATE_LIMIT_BUCKET_KEY = 'api.rate_limit'
+
+# Refills the bucket for the time elapsed since the last call and takes one token if there is one.
+# Runs atomically in redis, so a rate limit check is a single round-trip.
+# KEYS[1]: bucket, ARGV[1]: capacity, ARGV[2]: refill rate in tokens per second
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+_token_bucket = None
+
+
+def _get_token_bucket_script():
+    global _token_bucket
+    if _token_bucket is None:
+        _token_bucket = get_redis_connection('default').register_script(TOKEN_BUCKET_SCRIPT)
+    return _token_bucket
+
+
+def take_token(key, capacity, rate):
+    """
+    Takes a token from the bucket stored under `key`, returns `(allowed, tokens left)`.
+    """
+    allowed, tokens = _get_token_bucket_script()(keys=[key], args=[capacity, rate])
+    return bool(allowed), float(tokens)
+
+
+def get_team_rate_limit(team) -> int:
+    return team.entitlements.api_rate_limit
+
+
+class TeamRateThrottle(BaseThrottle):
+    """
+    Token bucket per team, refilled at the team's requests per minute limit.
+
+    The team is the one set on the request by the team API key permissions, requests authenticated
+    as a user are limited per user with API_RATE_LIMIT_PER_MINUTE. Anonymous requests are not
+    limited. When redis is unreachable requests are let through.
+    """
+
+    def get_bucket(self, request):
+        team = getattr(request, 'team', None)
+        if team is not None:
+            return f'team:{team.id}', get_team_rate_limit(team)
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}', settings.API_RATE_LIMIT_PER_MINUTE
+        return None, None
+
+    def allow_request(self, request, view):
+        self.limit = self.remaining = self.retry_after = None
+        ident, limit = self.get_bucket(request)
+        if not ident or not limit:
+            return True
+
+        rate = limit / 60
+        try:
+            allowed, tokens = take_token(f'{RATE_LIMIT_BUCKET_KEY}:{ident}', limit, rate)
+        except Exception:
+            logger.exception("Rate limit check failed")
+            return True
+
+        self.limit = limit
+        self.remaining = int(tokens)
+        self.reset = math.ceil((limit - tokens) / rate)
+        if not allowed:
+            self.retry_after = math.ceil((1 - tokens) / rate)
+        # picked up by RateLimitHeadersMixin
+        request.rate_limit = self
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+    def get_headers(self):
+        # https://datatracker.ietf.org/doc/draft-ietf-httpapi-ratelimit-headers/
+        return {
+            'RateLimit-Limit': str(self.limit),
+            'RateLimit-Remaining': str(self.remaining),
+            'RateLimit-Reset': str(self.reset),
+        }
+
+
+class RateLimitHeadersMixin:
+    """
+    Adds the RateLimit headers of TeamRateThrottle to the view's responses.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            for header, value in rate_limit.get_headers().items():
+                response[header] = value
+        return response
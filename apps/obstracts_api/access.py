@@ -0,0 +1,72 @@
+import uuid
+from dataclasses import dataclass
+
+from django.db.models import Exists, OuterRef
+
+from apps.teams.entitlements import get_cached_team_entitlements, get_team_entitlements
+from apps.teams.models import Team
+from apps.teams.roles import get_cached_team_roles, save_team_roles
+from .models import FeedSubsription
+from .subscription_index import is_team_subscribed
+
+
+@dataclass(frozen=True)
+class TeamFeedAccess:
+    team_exists: bool = False
+    has_active_subscription: bool = False
+    is_member: bool = False
+    is_subscribed: bool = False
+
+    @property
+    def allowed(self) -> bool:
+        return self.team_exists and self.has_active_subscription and self.is_member and self.is_subscribed
+
+
+def _query_team_access(team_id, feed_id):
+    team = (
+        Team.objects.filter(id=team_id)
+        .select_related("subscription__plan__product")
+        .annotate(is_subscribed=Exists(FeedSubsription.objects.filter(team=OuterRef("pk"), feed_id=feed_id)))
+        .first()
+    )
+    if team is None:
+        return None, False
+    # built from the subscription loaded with the team, this warms the cache for the next request
+    return get_team_entitlements(team), team.is_subscribed
+
+
+def get_team_feed_access(team_id, user, feed_id) -> TeamFeedAccess:
+    """
+    Checks that the team exists and has an active subscription, that `user` is a member of it and
+    that it is subscribed to the feed.
+
+    Answered from the cached team roles of `user`, the cached entitlements of the team and the team
+    feed index. Whatever is not cached is loaded with one query for the roles and one for the team
+    and its feed subscription, both cached for the next request.
+    """
+    try:
+        team_id = str(uuid.UUID(str(team_id)))
+        feed_id = str(uuid.UUID(str(feed_id)))
+    except ValueError:
+        return TeamFeedAccess()
+
+    roles = get_cached_team_roles(user.pk)
+    if roles is None:
+        roles = save_team_roles(user.pk)
+    is_member = team_id in roles
+
+    entitlements = get_cached_team_entitlements(team_id)
+    is_subscribed = None
+    if entitlements is None:
+        entitlements, is_subscribed = _query_team_access(team_id, feed_id)
+        if entitlements is None:
+            return TeamFeedAccess()
+    if is_subscribed is None:
+        # the feed index is only looked up for requests that can pass the other checks
+        is_subscribed = is_member and entitlements.has_active_subscription and is_team_subscribed(team_id, feed_id)
+    return TeamFeedAccess(
+        team_exists=True,
+        has_active_subscription=entitlements.has_active_subscription,
+        is_member=is_member,
+        is_subscribed=is_subscribed,
+    )
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ObstractsApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.obstracts_api"
+
+    def ready(self):
+        from . import receivers  # noqa F401
@@ -0,0 +1,217 @@
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .exceptions import CircuitOpen
+
+logger = logging.getLogger("obstracts_web.obstracts_api")
+
+BREAKER_STATE_KEY = 'obstracts_api.breaker'
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Per-process circuit breaker for calls to the Obstracts service.
+
+    The breaker trips once at least `minimum_calls` calls were made within the last `window`
+    seconds and the share of failures among them reaches `failure_rate`. While open, calls are
+    rejected with CircuitOpen (503). After `reset_timeout` seconds up to `half_open_calls` probe
+    calls are let through: a successful probe closes the breaker, a failed one opens it again.
+
+    `before_call` tells whether the call is a probe, which is passed back to `record_success`,
+    `record_failure` or `release_call`. Calls that were already in flight when the breaker opened
+    do not decide the outcome of the half open state.
+    """
+
+    def __init__(self, name, failure_rate, minimum_calls, window, reset_timeout, half_open_calls):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+
+        self.state = STATE_CLOSED
+        self.opened_at = None
+        self.state_changed_at = time.time()
+        self.probes_in_flight = 0
+        # [second, calls, failures] of the window, oldest first, with running totals
+        self.buckets = deque()
+        self.window_calls = 0
+        self.window_failures = 0
+        self.counters = {
+            'calls': 0,
+            'failures': 0,
+            'rejected': 0,
+            'opened': 0,
+        }
+        self._lock = threading.Lock()
+
+    def before_call(self) -> bool:
+        """
+        Raises CircuitOpen when the call is rejected, returns whether it is a half open probe.
+        """
+        snapshot = None
+        probe = False
+        try:
+            with self._lock:
+                if self.state == STATE_OPEN:
+                    retry_after = self.opened_at + self.reset_timeout - time.time()
+                    if retry_after > 0:
+                        self.counters['rejected'] += 1
+                        raise CircuitOpen(wait=retry_after)
+                    snapshot = self._set_state(STATE_HALF_OPEN)
+                if self.state == STATE_HALF_OPEN:
+                    if self.probes_in_flight >= self.half_open_calls:
+                        self.counters['rejected'] += 1
+                        raise CircuitOpen(wait=self.reset_timeout)
+                    self.probes_in_flight += 1
+                    probe = True
+                self.counters['calls'] += 1
+        finally:
+            publish_snapshot(snapshot)
+        return probe
+
+    def record_success(self, probe=False):
+        snapshot = None
+        with self._lock:
+            if self.state == STATE_HALF_OPEN:
+                if probe:
+                    self._clear_window()
+                    snapshot = self._set_state(STATE_CLOSED)
+            else:
+                self._record(False)
+                if self._failure_rate_exceeded():
+                    snapshot = self._open()
+        publish_snapshot(snapshot)
+
+    def record_failure(self, probe=False):
+        snapshot = None
+        with self._lock:
+            self.counters['failures'] += 1
+            if self.state == STATE_HALF_OPEN:
+                if probe:
+                    snapshot = self._open()
+            else:
+                self._record(True)
+                if self._failure_rate_exceeded():
+                    snapshot = self._open()
+        publish_snapshot(snapshot)
+
+    def release_call(self, probe=False):
+        """
+        For calls that ended without an outcome, such as a cancelled request: frees the probe slot
+        taken by `before_call` so the breaker does not stay half open forever.
+        """
+        if not probe:
+            return
+        with self._lock:
+            if self.state == STATE_HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def _record(self, failed):
+        now = int(time.time())
+        if not self.buckets or self.buckets[-1][0] != now:
+            self.buckets.append([now, 0, 0])
+        bucket = self.buckets[-1]
+        bucket[1] += 1
+        bucket[2] += failed
+        self.window_calls += 1
+        self.window_failures += failed
+        while self.buckets[0][0] < now - self.window:
+            _, calls, failures = self.buckets.popleft()
+            self.window_calls -= calls
+            self.window_failures -= failures
+
+    def _clear_window(self):
+        self.buckets.clear()
+        self.window_calls = 0
+        self.window_failures = 0
+
+    def _failure_rate_exceeded(self):
+        if self.state != STATE_CLOSED or self.window_calls < self.minimum_calls:
+            return False
+        return self.window_failures / self.window_calls >= self.failure_rate
+
+    def _open(self):
+        self.opened_at = time.time()
+        self.counters['opened'] += 1
+        return self._set_state(STATE_OPEN)
+
+    def _set_state(self, state):
+        """
+        Returns the snapshot to publish once the lock is released, publishing is a blocking cache call.
+        """
+        logger.warning(f"Obstracts circuit breaker {self.name}: {self.state} -> {state}")
+        self.state = state
+        self.state_changed_at = time.time()
+        self.probes_in_flight = 0
+        return self._snapshot()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> dict:
+        return {
+            'name': self.name,
+            'worker': f'{socket.gethostname()}:{os.getpid()}',
+            'state': self.state,
+            'state_changed_at': self.state_changed_at,
+            'window_calls': self.window_calls,
+            'window_failures': self.window_failures,
+            **self.counters,
+        }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name='obstracts') -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(
+                    name,
+                    failure_rate=settings.OBSTRACT_CIRCUIT_FAILURE_RATE,
+                    minimum_calls=settings.OBSTRACT_CIRCUIT_MINIMUM_CALLS,
+                    window=settings.OBSTRACT_CIRCUIT_WINDOW,
+                    reset_timeout=settings.OBSTRACT_CIRCUIT_RESET_TIMEOUT,
+                    half_open_calls=settings.OBSTRACT_CIRCUIT_HALF_OPEN_CALLS,
+                )
+    return breaker
+
+
+def get_local_snapshots():
+    return [breaker.snapshot() for breaker in list(_breakers.values())]
+
+
+def publish_snapshot(snapshot):
+    """
+    Share a breaker's state with the metrics endpoint, which may be served by another worker.
+    """
+    if snapshot is None:
+        return
+    key = f"{BREAKER_STATE_KEY}:{snapshot['name']}:{snapshot['worker']}"
+    try:
+        cache.set(key, snapshot, timeout=settings.OBSTRACT_CIRCUIT_METRICS_TTL)
+    except Exception:
+        logger.exception("Could not publish circuit breaker state")
+
+
+def get_published_snapshots():
+    keys = list(cache.iter_keys(f'{BREAKER_STATE_KEY}:*'))
+    return list(cache.get_many(keys).values())
@@ -0,0 +1,170 @@
+import hashlib
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+PROXY_RESPONSE_CACHE_KEY = 'obstracts_api.proxy_response'
+PROXY_REFRESH_KEY = 'obstracts_api.proxy_refresh'
+
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    content: bytes
+    content_type: str = None
+    # content is stored as sent by the Obstracts service, still compressed
+    content_encoding: str = None
+    headers: dict = field(default_factory=dict)
+    fresh_until: float = 0
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.time() < self.fresh_until
+
+    @property
+    def etag(self):
+        return self.headers.get('ETag')
+
+    @property
+    def last_modified(self):
+        return self.headers.get('Last-Modified')
+
+    def get_validators(self) -> dict:
+        """
+        Conditional request headers used to revalidate this entry with the Obstracts service.
+        """
+        validators = {}
+        if self.etag:
+            validators['If-None-Match'] = self.etag
+        if self.last_modified:
+            validators['If-Modified-Since'] = self.last_modified
+        return validators
+
+    def is_servable_stale(self, stale_ttl) -> bool:
+        return time.time() < self.fresh_until + stale_ttl
+
+    def refresh(self, timeout):
+        self.fresh_until = time.time() + timeout
+
+
+def get_proxy_cache_key(path, params, vary=()):
+    """
+    Key for a proxied GET, built from the upstream path and the sorted query params.
+
+    Nothing identifying the caller goes into the key: authorization is checked before the cache
+    is consulted, so entries are shared between teams.
+    """
+    # urlencode escapes the separators, so values containing `&` or `=` cannot collide with other params
+    query = urlencode(sorted(params))
+    raw_key = '|'.join([path, query, *vary])
+    return f'{PROXY_RESPONSE_CACHE_KEY}:{hashlib.sha256(raw_key.encode()).hexdigest()}'
+
+
+def get_cached_response(key):
+    return cache.get(key)
+
+
+def save_cached_response(key, cached_response: CachedResponse, timeout):
+    cached_response.refresh(timeout)
+    # entries are kept past their freshness so they can still be revalidated with ETag / Last-Modified
+    cache.set(key, cached_response, timeout=timeout + settings.OBSTRACT_PROXY_CACHE_REVALIDATE_TTL)
+
+
+def acquire_refresh_lock(key, timeout) -> bool:
+    """
+    True for the one caller that gets to refresh `key` in the background, until the lock expires
+    or `release_refresh_lock` is called.
+    """
+    return cache.add(f'{PROXY_REFRESH_KEY}:{key}', 1, timeout=timeout)
+
+
+def release_refresh_lock(key):
+    cache.delete(f'{PROXY_REFRESH_KEY}:{key}')
+
+
+POST_CACHE_KEY = 'obstracts_api.post'
+POST_CACHE_VERSION_KEY = 'obstracts_api.post_version'
+LATEST_POSTS_CACHE_KEY = 'obstracts_api.latest_posts'
+
+
+def _get_post_versions(feed_ids) -> dict:
+    """
+    Current cache version of the posts of each feed. Feeds without one get a new version, so entries
+    left behind by an evicted version are never read again.
+    """
+    keys = {feed_id: f'{POST_CACHE_VERSION_KEY}:{feed_id}' for feed_id in feed_ids}
+    versions = cache.get_many(keys.values())
+    feed_versions = {}
+    for feed_id, key in keys.items():
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+        feed_versions[feed_id] = versions[key]
+    return feed_versions
+
+
+def _get_post_key(feed_id, post_id, version):
+    return f'{POST_CACHE_KEY}:{feed_id}:{version}:{post_id}'
+
+
+def get_cached_posts(post_ids) -> dict:
+    """
+    Cached posts of a list of (feed id, post id), keyed by (feed id, post id). Misses are left out.
+
+    Costs one cache round trip for the feed versions and one for the posts, whatever the number of posts.
+    """
+    if not post_ids:
+        return {}
+    versions = _get_post_versions(dict.fromkeys(feed_id for feed_id, _ in post_ids))
+    keys = {_get_post_key(feed_id, post_id, versions[feed_id]): (feed_id, post_id) for feed_id, post_id in post_ids}
+    return {keys[key]: post for key, post in cache.get_many(keys.keys()).items()}
+
+
+def save_cached_posts(posts: dict):
+    """
+    Caches posts fetched from the Obstracts service, keyed by (feed id, post id), for
+    OBSTRACT_POST_CACHE_TTL seconds.
+    """
+    if not posts:
+        return
+    versions = _get_post_versions(dict.fromkeys(feed_id for feed_id, _ in posts))
+    cache.set_many(
+        {_get_post_key(feed_id, post_id, versions[feed_id]): post for (feed_id, post_id), post in posts.items()},
+        timeout=settings.OBSTRACT_POST_CACHE_TTL,
+    )
+
+
+def invalidate_cached_posts(feed_id):
+    """
+    Drops the cached posts of a feed, done when a job of the feed finishes.
+    """
+    cache.set(f'{POST_CACHE_VERSION_KEY}:{feed_id}', time.time_ns(), timeout=None)
+
+
+def get_feed_set_hash(feed_ids) -> str:
+    """
+    Content hash of a set of feed ids, the same whatever the order or repetitions of the ids.
+    """
+    raw_key = ','.join(sorted({str(feed_id) for feed_id in feed_ids}))
+    return hashlib.sha256(raw_key.encode()).hexdigest()
+
+
+def _get_latest_posts_key(feed_set_hash, params):
+    query = urlencode(sorted(params.items()))
+    return f'{LATEST_POSTS_CACHE_KEY}:{feed_set_hash}:{hashlib.sha256(query.encode()).hexdigest()}'
+
+
+def get_cached_latest_posts(feed_set_hash, params):
+    return cache.get(_get_latest_posts_key(feed_set_hash, params))
+
+
+def save_cached_latest_posts(feed_set_hash, params, response_data):
+    cache.set(
+        _get_latest_posts_key(feed_set_hash, params),
+        response_data,
+        timeout=settings.OBSTRACT_LATEST_POSTS_CACHE_TTL,
+    )
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from .breaker import get_breaker
+
+
+class ObstractsSession(requests.Session):
+    """
+    requests.Session that applies a default timeout to every call made to the Obstracts service.
+    """
+
+    def __init__(self, timeout=None):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    session = ObstractsSession(
+        timeout=(
+            settings.OBSTRACT_SERVICE_CONNECT_TIMEOUT,
+            settings.OBSTRACT_SERVICE_READ_TIMEOUT,
+        )
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings.OBSTRACT_SERVICE_POOL_CONNECTIONS,
+        pool_maxsize=settings.OBSTRACT_SERVICE_POOL_MAXSIZE,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+
+def get_session() -> ObstractsSession:
+    """
+    Returns the per-process session used for all Obstracts service calls.
+
+    The session is rebuilt after a fork (gunicorn / celery prefork workers) so that
+    pooled sockets are never shared between processes.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+def get_timeout(endpoint=None):
+    """
+    (connect, read) timeout for calls to `endpoint`, see OBSTRACT_SERVICE_READ_TIMEOUTS.
+    """
+    return (
+        settings.OBSTRACT_SERVICE_CONNECT_TIMEOUT,
+        settings.OBSTRACT_SERVICE_READ_TIMEOUTS.get(endpoint, settings.OBSTRACT_SERVICE_READ_TIMEOUT),
+    )
+
+
+def is_failure_status(status_code) -> bool:
+    # 501 and 505 are answers from a healthy service
+    return status_code in (500, 502, 503, 504)
+
+
+def request(method, url, endpoint=None, **kwargs):
+    """
+    Call the Obstracts service through the pooled session and the circuit breaker.
+
+    Raises CircuitOpen without calling the service while the breaker is open.
+    """
+    kwargs.setdefault("timeout", get_timeout(endpoint))
+    if not settings.OBSTRACT_CIRCUIT_BREAKER_ENABLED:
+        return get_session().request(method, url, **kwargs)
+
+    breaker = get_breaker()
+    probe = breaker.before_call()
+    try:
+        response = get_session().request(method, url, **kwargs)
+    except requests.RequestException:
+        breaker.record_failure(probe=probe)
+        raise
+    except BaseException:
+        breaker.release_call(probe=probe)
+        raise
+    if is_failure_status(response.status_code):
+        breaker.record_failure(probe=probe)
+    else:
+        breaker.record_success(probe=probe)
+    return response
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request("PATCH", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_httpx_timeout(timeout=None) -> httpx.Timeout:
+    """
+    Converts a requests style timeout (a number or a (connect, read) tuple) to an httpx.Timeout.
+    """
+    if timeout is None:
+        timeout = get_timeout()
+    if isinstance(timeout, (tuple, list)):
+        connect_timeout, read_timeout = timeout
+        return httpx.Timeout(read_timeout, connect=connect_timeout)
+    return httpx.Timeout(timeout)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Returns the pooled httpx.AsyncClient for the running event loop, used by the ASGI proxy views.
+    """
+    loop = asyncio.get_running_loop()
+    async_client = _async_clients.get(loop)
+    if async_client is None or async_client.is_closed:
+        async_client = _async_clients[loop] = httpx.AsyncClient(
+            timeout=get_httpx_timeout(),
+            limits=httpx.Limits(
+                max_connections=settings.OBSTRACT_SERVICE_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OBSTRACT_SERVICE_POOL_MAXSIZE,
+            ),
+            follow_redirects=False,
+        )
+    return async_client
+
+
+async def async_send(async_client, upstream_request, stream=False):
+    """
+    Async counterpart of `request`, sends `upstream_request` through the circuit breaker.
+    """
+    if not settings.OBSTRACT_CIRCUIT_BREAKER_ENABLED:
+        return await async_client.send(upstream_request, stream=stream)
+
+    breaker = get_breaker()
+    probe = breaker.before_call()
+    try:
+        response = await async_client.send(upstream_request, stream=stream)
+    except httpx.HTTPError:
+        breaker.record_failure(probe=probe)
+        raise
+    except BaseException:
+        # cancelled (client disconnect) or unexpected errors must not keep the probe slot
+        breaker.release_call(probe=probe)
+        raise
+    if is_failure_status(response.status_code):
+        breaker.record_failure(probe=probe)
+    else:
+        breaker.record_success(probe=probe)
+    return response
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import LockError
+
+
+COALESCE_KEY = 'obstracts_api.coalesce'
+
+COALESCE_OFF = 'off'
+COALESCE_LOCAL = 'local'
+COALESCE_REDIS = 'redis'
+
+
+class _LeaderFailed:
+    """
+    Published by a redis leader whose call raised, so followers in other workers stop waiting.
+    """
+
+    def __init__(self, error=None):
+        self.error = error
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+def single_flight(key, fn):
+    """
+    Runs `fn` once for all concurrent callers sharing `key` and hands every caller the leader's result.
+
+    Callers in the same process wait on the leader's thread. With OBSTRACT_PROXY_COALESCE set to
+    "redis", the leader also takes a redis lock so that callers in other workers wait for its
+    result instead of going upstream themselves. Followers that time out waiting call `fn` on
+    their own.
+
+    Returns `(result, is_leader)`. `fn` must return a picklable, non-None value.
+    """
+    mode = settings.OBSTRACT_PROXY_COALESCE
+    if mode == COALESCE_OFF:
+        return fn(), True
+
+    with _calls_lock:
+        call = _calls.get(key)
+        is_leader = call is None
+        if is_leader:
+            call = _calls[key] = _Call()
+
+    if not is_leader:
+        if not call.done.wait(settings.OBSTRACT_PROXY_COALESCE_TIMEOUT):
+            return fn(), True
+        if call.error:
+            raise call.error
+        if call.result is None:
+            # the leader was interrupted without a result
+            return fn(), True
+        return call.result, False
+
+    try:
+        if mode == COALESCE_REDIS:
+            call.result, is_leader = _redis_single_flight(key, fn)
+        else:
+            call.result = fn()
+        return call.result, is_leader
+    except Exception as exc:
+        call.error = exc
+        raise
+    finally:
+        with _calls_lock:
+            _calls.pop(key, None)
+        call.done.set()
+
+
+def _redis_single_flight(key, fn):
+    result_key = f'{COALESCE_KEY}:result:{key}'
+    timeout = settings.OBSTRACT_PROXY_COALESCE_TIMEOUT
+    # only needs to outlive the followers polling for it
+    result_timeout = max(1, int(timeout))
+    lock = cache.lock(f'{COALESCE_KEY}:lock:{key}', timeout=timeout)
+    if lock.acquire(blocking=False):
+        try:
+            cache.delete(result_key)
+            try:
+                result = fn()
+            except Exception as exc:
+                _publish_error(result_key, exc, result_timeout)
+                raise
+            cache.set(result_key, result, timeout=result_timeout)
+            return result, True
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                # lock expired while fn was running, another worker may have taken over
+                pass
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(settings.OBSTRACT_PROXY_COALESCE_POLL_INTERVAL)
+        result = cache.get(result_key)
+        if result is None and not lock.locked():
+            # the leader may have published right before releasing the lock
+            result = cache.get(result_key)
+            if result is None:
+                # the leader went away without a result
+                break
+        if isinstance(result, _LeaderFailed):
+            if result.error is None:
+                break
+            raise result.error
+        if result is not None:
+            return result, False
+    return fn(), True
+
+
+def _publish_error(result_key, error, timeout):
+    try:
+        cache.set(result_key, _LeaderFailed(error), timeout=timeout)
+    except Exception:
+        # errors that cannot be pickled make followers call fn themselves
+        cache.set(result_key, _LeaderFailed(), timeout=timeout)
+
+
+_async_calls = {}
+
+
+async def async_single_flight(key, fn):
+    """
+    single_flight for the ASGI proxy views: `fn` is a coroutine function and callers are coalesced
+    within the running event loop. The redis mode is not used here.
+    """
+    if settings.OBSTRACT_PROXY_COALESCE == COALESCE_OFF:
+        return await fn(), True
+
+    call_key = (id(asyncio.get_running_loop()), key)
+    future = _async_calls.get(call_key)
+    if future is not None:
+        try:
+            result = await asyncio.wait_for(
+                asyncio.shield(future), settings.OBSTRACT_PROXY_COALESCE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            return await fn(), True
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                # this caller was cancelled
+                raise
+            # the leader was cancelled, e.g. its client disconnected
+            return await fn(), True
+        return result, False
+
+    future = _async_calls[call_key] = asyncio.get_running_loop().create_future()
+    try:
+        result = await fn()
+        future.set_result(result)
+        return result, True
+    except Exception as exc:
+        future.set_exception(exc)
+        # mark the exception as retrieved in case there were no followers
+        future.exception()
+        raise
+    except BaseException:
+        future.cancel()
+        raise
+    finally:
+        _async_calls.pop(call_key, None)
@@ -0,0 +1,49 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class BadGateway(APIException):
+    status_code = status.HTTP_502_BAD_GATEWAY
+    default_detail = "Obstracts service is unreachable."
+    default_code = "bad_gateway"
+
+
+class GatewayTimeout(APIException):
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    default_detail = "Obstracts service did not respond in time."
+    default_code = "gateway_timeout"
+
+
+class CircuitOpen(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Obstracts service is temporarily unavailable, try again later."
+    default_code = "service_unavailable"
+
+    def __init__(self, detail=None, code=None, wait=None):
+        super().__init__(detail, code)
+        # sent back as Retry-After by DRF's exception handler
+        self.wait = max(1, int(wait)) if wait else None
+
+
+class SubscriptionRequired(APIException):
+    status_code = status.HTTP_403_FORBIDDEN
+    default_detail = "Team has no access to this API"
+    default_code = "subscription_required"
+
+
+class TeamNotFound(APIException):
+    status_code = status.HTTP_404_NOT_FOUND
+    default_detail = "Team not found"
+    default_code = "team_not_found"
+
+
+class NotTeamMember(APIException):
+    status_code = status.HTTP_403_FORBIDDEN
+    default_detail = "You are not a member of this team"
+    default_code = "not_team_member"
+
+
+class FeedNotSubscribed(APIException):
+    status_code = status.HTTP_403_FORBIDDEN
+    default_detail = "Team is not subscribed to this feed"
+    default_code = "feed_not_subscribed"
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.obstracts_api.subscription_index import rebuild_team_feed_indexes
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the redis index of the feeds each team is subscribed to from the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--team", action="append", dest="team_ids", help="Only rebuild this team, can be repeated")
+
+    def handle(self, *args, team_ids=None, **options):
+        count = rebuild_team_feed_indexes(team_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the feed index of {count} team(s)"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apps.obstracts_api.models import Feed
+from apps.obstracts_api.post_index import sync_feed_posts
+
+
+class Command(BaseCommand):
+    help = "Copies the posts of feeds from the Obstracts service into the local post index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--feed", action="append", dest="feed_ids", help="Only sync this feed, can be repeated")
+        parser.add_argument("--full", action="store_true", help="Read every post and remove the ones deleted upstream")
+
+    def handle(self, *args, feed_ids=None, full=False, **options):
+        feeds = Feed.objects.all()
+        if feed_ids:
+            feeds = feeds.filter(id__in=feed_ids)
+        count = 0
+        for feed_id in feeds.values_list("id", flat=True):
+            count += sync_feed_posts(feed_id, full=full)
+        self.stdout.write(self.style.SUCCESS(f"Synced {count} post(s)"))
@@ -4,7 +4,8 @@ from django.utils.functional import SimpleLazyObject
 
 from apps.teams.helpers import get_team_for_request
 from apps.teams.models import Membership
-from .models import TeamApiKey, FeedSubsription
+from .models import TeamApiKey
+from .subscription_index import is_team_subscribed
 
 
 def _get_team(request, view_kwargs):
@@ -39,7 +40,7 @@ def has_team_api_permission(request, view_kwargs):
             raise PermissionDenied()
         if not TeamApiKey.objects.filter(team_id=team_id, api_key=api_key).exists():
             raise PermissionDenied()
-        if not FeedSubsription.objects.filter(team_id=team_id, feed_id=feed_id).exists():
+        if not is_team_subscribed(team_id, feed_id):
             raise PermissionDenied()
         return True
     return _has_team_api_permission()
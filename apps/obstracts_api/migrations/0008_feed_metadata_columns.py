@@ -0,0 +1,115 @@
+from django.core.exceptions import ValidationError
+from django.db import migrations, models
+from django.db.models.functions import Left
+
+
+METADATA_FIELDS = {
+    "url": "metadata_url",
+    "title": "metadata_title",
+    "feed_type": "metadata_feed_type",
+    "pretty_url": "metadata_pretty_url",
+    "description": "metadata_description",
+    "count_of_posts": "metadata_count_of_posts",
+    "datetime_added": "metadata_datetime_added",
+    "latest_item_pubdate": "metadata_latest_item_pubdate",
+    "earliest_item_pubdate": "metadata_earliest_item_pubdate",
+}
+
+
+def backfill_metadata_fields(apps, schema_editor):
+    Feed = apps.get_model("obstracts_api", "Feed")
+    feeds = []
+    for feed in Feed.objects.only("id", "obstract_feed_metadata").iterator(chunk_size=500):
+        metadata = feed.obstract_feed_metadata or {}
+        for key, field_name in METADATA_FIELDS.items():
+            try:
+                value = Feed._meta.get_field(field_name).to_python(metadata.get(key))
+            except ValidationError:
+                value = None
+            setattr(feed, field_name, value)
+        feeds.append(feed)
+        if len(feeds) == 500:
+            Feed.objects.bulk_update(feeds, list(METADATA_FIELDS.values()))
+            feeds = []
+    Feed.objects.bulk_update(feeds, list(METADATA_FIELDS.values()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("obstracts_api", "0007_alter_feed_next_polling_time_alter_feed_profile_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="metadata_url",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="metadata_title",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="metadata_feed_type",
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="metadata_pretty_url",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="metadata_description",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="metadata_count_of_posts",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="metadata_datetime_added",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="metadata_latest_item_pubdate",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="metadata_earliest_item_pubdate",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_metadata_fields, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="feed",
+            # a prefix of the unbounded title keeps the btree entries under the page size limit
+            index=models.Index(Left("metadata_title", 255), models.F("id"), name="feed_metadata_title_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="feed",
+            index=models.Index(fields=["metadata_feed_type"], name="feed_metadata_feed_type_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="feed",
+            index=models.Index(fields=["metadata_count_of_posts"], name="feed_metadata_post_count_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="feed",
+            index=models.Index(fields=["metadata_datetime_added"], name="feed_metadata_added_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="feed",
+            index=models.Index(fields=["metadata_latest_item_pubdate"], name="feed_metadata_latest_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="feed",
+            index=models.Index(fields=["metadata_earliest_item_pubdate"], name="feed_metadata_earliest_idx"),
+        ),
+    ]
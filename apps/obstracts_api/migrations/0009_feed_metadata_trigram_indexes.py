@@ -0,0 +1,42 @@
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("obstracts_api", "0008_feed_metadata_columns"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="feed",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("metadata_title"), name="gin_trgm_ops"
+                ),
+                name="feed_metadata_title_trgm",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="feed",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("metadata_pretty_url"), name="gin_trgm_ops"
+                ),
+                name="feed_metadata_pretty_url_trgm",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="feed",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("metadata_description"), name="gin_trgm_ops"
+                ),
+                name="feed_metadata_desc_trgm",
+            ),
+        ),
+    ]
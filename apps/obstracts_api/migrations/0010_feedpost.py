@@ -0,0 +1,50 @@
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("obstracts_api", "0009_feed_metadata_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedPost",
+            fields=[
+                ("id", models.UUIDField(primary_key=True, serialize=False)),
+                ("title", models.TextField(blank=True, null=True)),
+                ("pubdate", models.DateTimeField(blank=True, null=True)),
+                ("datetime_added", models.DateTimeField(blank=True, null=True)),
+                ("datetime_updated", models.DateTimeField(blank=True, null=True)),
+                ("metadata", models.JSONField()),
+                (
+                    "feed",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="posts",
+                        to="obstracts_api.feed",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["pubdate", "id"], name="feed_post_pubdate_idx"),
+                    models.Index(
+                        django.db.models.functions.text.Left("title", 255), models.F("id"), name="feed_post_title_idx"
+                    ),
+                    models.Index(fields=["datetime_added", "id"], name="feed_post_added_idx"),
+                    models.Index(fields=["datetime_updated", "id"], name="feed_post_updated_idx"),
+                    models.Index(fields=["feed", "datetime_updated"], name="feed_post_feed_updated_idx"),
+                    django.contrib.postgres.indexes.GinIndex(
+                        django.contrib.postgres.indexes.OpClass(
+                            django.db.models.functions.text.Upper("title"), name="gin_trgm_ops"
+                        ),
+                        name="feed_post_title_trgm",
+                    ),
+                ],
+            },
+        ),
+    ]
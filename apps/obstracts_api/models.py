@@ -1,10 +1,18 @@
 import uuid
+from django.core.exceptions import ValidationError
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Left, Upper
 from django.conf import settings
 from  apps.teams.models import Team
 from rest_framework_api_key.models import AbstractAPIKey
 
 
+# btree entries must fit in about a third of a page, so unbounded titles are sorted and indexed on
+# their first TITLE_SORT_LENGTH characters
+TITLE_SORT_LENGTH = 255
+
+
 # Create your models here.
 class Feed(models.Model):
     id = models.UUIDField(default=uuid.uuid4, primary_key=True, unique=True)
@@ -18,6 +26,109 @@ class Feed(models.Model):
     title = models.CharField(max_length=50, blank=True, null=True)
     active_job_id = models.UUIDField(blank=True, null=True)
 
+    # copied from obstract_feed_metadata on save so feeds can be sorted and searched with an index,
+    # see METADATA_FIELDS
+    metadata_url = models.TextField(blank=True, null=True)
+    metadata_title = models.TextField(blank=True, null=True)
+    metadata_feed_type = models.CharField(max_length=50, blank=True, null=True)
+    metadata_pretty_url = models.TextField(blank=True, null=True)
+    metadata_description = models.TextField(blank=True, null=True)
+    metadata_count_of_posts = models.IntegerField(blank=True, null=True)
+    metadata_datetime_added = models.DateTimeField(blank=True, null=True)
+    metadata_latest_item_pubdate = models.DateTimeField(blank=True, null=True)
+    metadata_earliest_item_pubdate = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(Left("metadata_title", TITLE_SORT_LENGTH), "id", name="feed_metadata_title_idx"),
+            models.Index(fields=["metadata_feed_type"], name="feed_metadata_feed_type_idx"),
+            models.Index(fields=["metadata_count_of_posts"], name="feed_metadata_post_count_idx"),
+            models.Index(fields=["metadata_datetime_added"], name="feed_metadata_added_idx"),
+            models.Index(fields=["metadata_latest_item_pubdate"], name="feed_metadata_latest_idx"),
+            models.Index(fields=["metadata_earliest_item_pubdate"], name="feed_metadata_earliest_idx"),
+            # icontains compiles to UPPER(column) LIKE UPPER(...), which these trigram indexes serve
+            GinIndex(OpClass(Upper("metadata_title"), name="gin_trgm_ops"), name="feed_metadata_title_trgm"),
+            GinIndex(OpClass(Upper("metadata_pretty_url"), name="gin_trgm_ops"), name="feed_metadata_pretty_url_trgm"),
+            GinIndex(OpClass(Upper("metadata_description"), name="gin_trgm_ops"), name="feed_metadata_desc_trgm"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.set_metadata_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "obstract_feed_metadata" in update_fields:
+            kwargs["update_fields"] = {*update_fields, *METADATA_FIELDS.values()}
+        return super().save(*args, **kwargs)
+
+    def set_metadata_fields(self):
+        metadata = self.obstract_feed_metadata or {}
+        for key, field_name in METADATA_FIELDS.items():
+            try:
+                value = self._meta.get_field(field_name).to_python(metadata.get(key))
+            except ValidationError:
+                value = None
+            setattr(self, field_name, value)
+
+
+# obstract_feed_metadata keys copied to Feed columns
+METADATA_FIELDS = {
+    "url": "metadata_url",
+    "title": "metadata_title",
+    "feed_type": "metadata_feed_type",
+    "pretty_url": "metadata_pretty_url",
+    "description": "metadata_description",
+    "count_of_posts": "metadata_count_of_posts",
+    "datetime_added": "metadata_datetime_added",
+    "latest_item_pubdate": "metadata_latest_item_pubdate",
+    "earliest_item_pubdate": "metadata_earliest_item_pubdate",
+}
+
+# METADATA_FIELDS columns sorted on the expression of their index rather than the column itself
+METADATA_SORT_EXPRESSIONS = {
+    "metadata_title": Left("metadata_title", TITLE_SORT_LENGTH),
+}
+
+
+class FeedPost(models.Model):
+    """
+    Local copy of the posts of a feed, synced by apps.obstracts_api.tasks.sync_feed_posts so the
+    latest posts of a team can be listed without searching the Obstracts service.
+    """
+
+    # the post id of the Obstracts service
+    id = models.UUIDField(primary_key=True)
+    feed = models.ForeignKey(Feed, on_delete=models.CASCADE, related_name="posts")
+    title = models.TextField(blank=True, null=True)
+    pubdate = models.DateTimeField(blank=True, null=True)
+    datetime_added = models.DateTimeField(blank=True, null=True)
+    datetime_updated = models.DateTimeField(blank=True, null=True)
+    # the post as returned by the Obstracts service
+    metadata = models.JSONField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["pubdate", "id"], name="feed_post_pubdate_idx"),
+            models.Index(Left("title", TITLE_SORT_LENGTH), "id", name="feed_post_title_idx"),
+            models.Index(fields=["datetime_added", "id"], name="feed_post_added_idx"),
+            models.Index(fields=["datetime_updated", "id"], name="feed_post_updated_idx"),
+            models.Index(fields=["feed", "datetime_updated"], name="feed_post_feed_updated_idx"),
+            GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="feed_post_title_trgm"),
+        ]
+
+    @classmethod
+    def from_metadata(cls, feed_id, metadata):
+        post = cls(id=metadata["id"], feed_id=feed_id, metadata=metadata)
+        for field_name in POST_FIELDS:
+            try:
+                value = cls._meta.get_field(field_name).to_python(metadata.get(field_name))
+            except ValidationError:
+                value = None
+            setattr(post, field_name, value)
+        return post
+
+
+# post keys copied to FeedPost columns
+POST_FIELDS = ["title", "pubdate", "datetime_added", "datetime_updated"]
+
 
 class FeedSubsription(models.Model):
     feed = models.ForeignKey(Feed, on_delete=models.CASCADE)
@@ -1,5 +1,12 @@
+import base64
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
 from rest_framework.pagination import PageNumberPagination, InvalidPage
 from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 class CustomPagination(PageNumberPagination):
     def paginate_queryset(self, queryset, request, view=None):
@@ -27,4 +34,143 @@ class CustomPagination(PageNumberPagination):
             # The browsable API should display pagination controls.
             self.display_page_controls = True
 
-        return self.page
\ No newline at end of file
+        return self.page
+
+
+class KeysetPagination(CustomPagination):
+    """
+    CustomPagination with two opt-in modes for large catalogs.
+
+    `?cursor=` switches to keyset pagination: pages are read with a `(sort key, pk)` filter from the
+    cursor returned as `next`, so deep pages cost the same as the first and no COUNT is run. The
+    queryset's order_by (such as the `sort_*` annotations of the feed views) is kept, ordering by
+    more than one field falls back to page numbers.
+
+    `?count=false` keeps page numbers but skips the COUNT, `next` is set when another page exists.
+    """
+
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.mode = "page"
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        ordering = self.get_keyset_ordering(queryset)
+        if self.cursor_query_param in request.query_params and ordering is not None:
+            self.mode = "cursor"
+            return self.paginate_keyset(queryset, request, page_size, ordering)
+        if request.query_params.get(self.count_query_param) == "false":
+            self.mode = "no_count"
+            return self.paginate_without_count(queryset, request, page_size)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_keyset_ordering(self, queryset):
+        """
+        `(field, descending)` of the queryset's ordering, `(None, False)` when it is not ordered and
+        None when it cannot be paginated by keyset.
+        """
+        order_by = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        order_by = [field for field in order_by if isinstance(field, str) and field.lstrip("-") not in ("pk", "id")]
+        if not order_by:
+            return None, False
+        # the sort key is read back from the last object of the page
+        if len(order_by) > 1 or "__" in order_by[0]:
+            return None
+        return order_by[0].lstrip("-"), order_by[0].startswith("-")
+
+    def paginate_keyset(self, queryset, request, page_size, ordering):
+        field, descending = ordering
+        pk_order = "-pk" if descending else "pk"
+        queryset = queryset.order_by(*([f"-{field}" if descending else field] if field else []), pk_order)
+
+        cursor = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        if cursor:
+            queryset = queryset.filter(self.get_keyset_filter(field, descending, *cursor))
+
+        results = list(queryset[: page_size + 1])
+        self.has_next = len(results) > page_size
+        results = results[:page_size]
+        self.next_cursor = None
+        if self.has_next:
+            last = results[-1]
+            self.next_cursor = self.encode_cursor(getattr(last, field) if field else None, last.pk)
+        return results
+
+    def get_keyset_filter(self, field, descending, value, pk):
+        # matches postgres' NULL placement: last when ascending, first when descending
+        if not field:
+            return Q(pk__lt=pk) if descending else Q(pk__gt=pk)
+        if descending:
+            if value is None:
+                return Q(**{f"{field}__isnull": True, "pk__lt": pk}) | Q(**{f"{field}__isnull": False})
+            return Q(**{f"{field}__lt": value}) | Q(**{field: value, "pk__lt": pk})
+        if value is None:
+            return Q(**{f"{field}__isnull": True, "pk__gt": pk})
+        return Q(**{f"{field}__gt": value}) | Q(**{field: value, "pk__gt": pk}) | Q(**{f"{field}__isnull": True})
+
+    def encode_cursor(self, value, pk):
+        data = json.dumps([value, pk], cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise NotFound("Invalid cursor.")
+        return value, pk
+
+    def paginate_without_count(self, queryset, request, page_size):
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound("Invalid page number.")
+        if self.page_number < 1:
+            raise NotFound("Invalid page number.")
+        offset = (self.page_number - 1) * page_size
+        results = list(queryset[offset: offset + page_size + 1])
+        self.has_next = len(results) > page_size
+        return results[:page_size]
+
+    def get_next_link(self):
+        if self.mode == "cursor":
+            if not self.next_cursor:
+                return None
+            return replace_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor
+            )
+        if self.mode == "no_count":
+            if not self.has_next:
+                return None
+            return replace_query_param(
+                self.request.build_absolute_uri(), self.page_query_param, self.page_number + 1
+            )
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if self.mode == "cursor":
+            # cursors only go forward
+            return None
+        if self.mode == "no_count":
+            if self.page_number == 1:
+                return None
+            if self.page_number == 2:
+                return remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+            return replace_query_param(
+                self.request.build_absolute_uri(), self.page_query_param, self.page_number - 1
+            )
+        return super().get_previous_link()
+
+    def get_paginated_response(self, data):
+        if self.mode == "page":
+            return super().get_paginated_response(data)
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
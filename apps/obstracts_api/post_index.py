@@ -0,0 +1,88 @@
+import logging
+
+from django.conf import settings
+from django.db.models import Max
+from django.db.models.functions import Left
+
+from .models import POST_FIELDS, TITLE_SORT_LENGTH, FeedPost
+from .utils import get_feed_posts
+
+logger = logging.getLogger("obstracts_web.obstracts_api")
+
+# `sort` values of the Obstracts /posts/ endpoint and the FeedPost ordering serving them
+POST_SORTS = {
+    "pubdate_descending": "-pubdate",
+    "pubdate_ascending": "pubdate",
+    "title_descending": "-sort_title",
+    "title_ascending": "sort_title",
+    "datetime_added_descending": "-datetime_added",
+    "datetime_added_ascending": "datetime_added",
+    "datetime_updated_descending": "-datetime_updated",
+    "datetime_updated_ascending": "datetime_updated",
+}
+
+# annotations used by POST_SORTS, titles are sorted on the bounded prefix indexed by feed_post_title_idx
+POST_SORT_ANNOTATIONS = {
+    "sort_title": Left("title", TITLE_SORT_LENGTH),
+}
+
+
+def sync_feed_posts(feed_id, full=False) -> int:
+    """
+    Copies the posts of a feed from the Obstracts service into FeedPost, returns the number of posts saved.
+
+    Posts are read most recently updated first and the sync stops at the first page older than the
+    newest local post. A `full` sync reads every page and removes the local posts the Obstracts
+    service no longer has.
+    """
+    since = None
+    if not full:
+        since = FeedPost.objects.filter(feed_id=feed_id).aggregate(since=Max("datetime_updated"))["since"]
+
+    seen_ids = set()
+    page = 1
+    while True:
+        response_data = get_feed_posts(
+            feed_id, page, settings.OBSTRACT_POST_SYNC_PAGE_SIZE, sort="datetime_updated_descending"
+        )
+        posts = []
+        for metadata in response_data["posts"]:
+            metadata["feed_id"] = str(feed_id)
+            posts.append(FeedPost.from_metadata(feed_id, metadata))
+        FeedPost.objects.bulk_create(
+            posts,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=["feed", "metadata", *POST_FIELDS],
+        )
+        seen_ids.update(post.id for post in posts)
+
+        if len(posts) < settings.OBSTRACT_POST_SYNC_PAGE_SIZE:
+            break
+        if since and posts[-1].datetime_updated and posts[-1].datetime_updated < since:
+            break
+        page += 1
+
+    if full:
+        deleted, _ = FeedPost.objects.filter(feed_id=feed_id).exclude(id__in=seen_ids).delete()
+        if deleted:
+            logger.info(f"Removed {deleted} post(s) of feed {feed_id} from the post index")
+    return len(seen_ids)
+
+
+def get_feed_post_queryset(feed_ids, sort, title=None):
+    """
+    FeedPost queryset of the latest posts of `feed_ids` (all feeds when None), with the filters and
+    sorts of the Obstracts /posts/ endpoint.
+    """
+    queryset = FeedPost.objects.all()
+    if feed_ids is not None:
+        queryset = queryset.filter(feed_id__in=feed_ids)
+    if title:
+        # served by the trigram index on title
+        queryset = queryset.filter(title__icontains=title)
+    order_by = POST_SORTS[sort]
+    annotation = POST_SORT_ANNOTATIONS.get(order_by.lstrip("-"))
+    if annotation is not None:
+        queryset = queryset.annotate(**{order_by.lstrip("-"): annotation})
+    return queryset.order_by(order_by, "pk")
@@ -0,0 +1,647 @@
+import gzip
+import itertools
+import logging
+import zlib
+
+import httpx
+import requests
+from urllib3.exceptions import HTTPError as Urllib3HTTPError, ReadTimeoutError
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.exceptions import (
+    AuthenticationFailed,
+    MethodNotAllowed,
+    NotAuthenticated,
+    PermissionDenied,
+)
+from rest_framework.views import APIView
+
+from . import client
+from .cache import (
+    CachedResponse,
+    acquire_refresh_lock,
+    get_cached_response,
+    get_proxy_cache_key,
+    save_cached_response,
+)
+from .coalesce import async_single_flight, single_flight
+from .exceptions import BadGateway, GatewayTimeout
+
+logger = logging.getLogger("obstracts_web.obstracts_api")
+
+# https://www.rfc-editor.org/rfc/rfc9110#section-7.6.1
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+# never forwarded upstream, on top of the hop-by-hop headers
+EXCLUDED_REQUEST_HEADERS = HOP_BY_HOP_HEADERS | {"host", "content-length", "accept-encoding"}
+
+# asked of the Obstracts service regardless of the client, compressed bodies are passed through as
+# they are and only decompressed for clients that do not accept the encoding
+UPSTREAM_ACCEPT_ENCODING = "gzip"
+
+FORWARDED_RESPONSE_HEADERS = (
+    "Content-Disposition",
+    "Content-Language",
+    "Cache-Control",
+    "ETag",
+    "Last-Modified",
+)
+
+# handled by the proxy itself when a route is cached
+CONDITIONAL_REQUEST_HEADERS = {"if-none-match", "if-modified-since"}
+
+
+def accepts_encoding(request, content_encoding) -> bool:
+    for coding in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() not in (content_encoding, "*"):
+            continue
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def decode_content(content, content_encoding):
+    if content_encoding == "gzip":
+        return gzip.decompress(content)
+    if content_encoding == "deflate":
+        return zlib.decompress(content)
+    return content
+
+
+def etag_matches(etag, if_none_match) -> bool:
+    """
+    Weak comparison of `etag` with every ETag listed in an If-None-Match header.
+    """
+    if not etag or not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    if "*" in etags:
+        return True
+    return etag.removeprefix("W/") in [tag.removeprefix("W/") for tag in etags]
+
+
+def _decode_chunks(chunks, content_encoding):
+    # gzip and zlib headers are both detected by the +32 window bits
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32)
+    for chunk in chunks:
+        yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+
+
+def _exceeds_cache_size(upstream_response, max_size) -> bool:
+    content_length = upstream_response.headers.get("Content-Length", "")
+    return content_length.isdigit() and int(content_length) > max_size
+
+
+def _iter_upstream_content(upstream_response, chunk_size, decode=False):
+    try:
+        # unless `decode` is set, the body is forwarded exactly as it was sent, content-encoding included
+        yield from upstream_response.raw.stream(chunk_size, decode_content=decode)
+    except ReadTimeoutError as exc:
+        raise GatewayTimeout() from exc
+    except Urllib3HTTPError as exc:
+        raise BadGateway() from exc
+    finally:
+        upstream_response.close()
+
+
+def _read_cacheable_content(upstream_response):
+    """
+    Reads the body of `upstream_response` when it fits in OBSTRACT_PROXY_CACHE_MAX_SIZE bytes.
+
+    Returns `(content, None)`, or `(None, chunks)` with an iterator over the whole body when it is
+    larger, so it can be streamed instead of being buffered.
+    """
+    max_size = settings.OBSTRACT_PROXY_CACHE_MAX_SIZE
+    chunks = _iter_upstream_content(upstream_response, settings.OBSTRACT_PROXY_CHUNK_SIZE)
+    if _exceeds_cache_size(upstream_response, max_size):
+        return None, chunks
+    buffered = []
+    size = 0
+    for chunk in chunks:
+        buffered.append(chunk)
+        size += len(chunk)
+        if size > max_size:
+            return None, itertools.chain(buffered, chunks)
+    return b"".join(buffered), None
+
+
+def store_upstream_response(cache_key, cached_response, upstream_response, content, cache_timeout):
+    """
+    Store an upstream response and its still encoded `content` under `cache_key` when it is
+    cacheable. A 304 answer to a revalidation refreshes `cached_response` instead.
+
+    Returns a `(CachedResponse, cache status)` tuple.
+    """
+    if cached_response and upstream_response.status_code == 304:
+        save_cached_response(cache_key, cached_response, cache_timeout)
+        return cached_response, "REVALIDATED"
+
+    cached_response = CachedResponse(
+        status_code=upstream_response.status_code,
+        content=content,
+        content_type=upstream_response.headers.get("Content-Type"),
+        content_encoding=upstream_response.headers.get("Content-Encoding"),
+        headers={
+            header: upstream_response.headers[header]
+            for header in FORWARDED_RESPONSE_HEADERS
+            if header in upstream_response.headers
+        },
+    )
+    if upstream_response.status_code != 200 or "no-store" in upstream_response.headers.get("Cache-Control", ""):
+        return cached_response, "BYPASS"
+    save_cached_response(cache_key, cached_response, cache_timeout)
+    return cached_response, "MISS"
+
+
+def refresh_cached_response(cache_key, target_url, params, headers, cache_timeout, endpoint=None):
+    """
+    Revalidate the entry under `cache_key` with the Obstracts service, see `stale_while_revalidate`.
+    """
+    cached_response = get_cached_response(cache_key)
+    if cached_response and cached_response.is_fresh:
+        return cached_response, "HIT"
+    headers = {**headers, "Accept-Encoding": UPSTREAM_ACCEPT_ENCODING}
+    if cached_response:
+        headers.update(cached_response.get_validators())
+    upstream_response = client.get(
+        target_url,
+        endpoint=endpoint,
+        headers=headers,
+        params=params,
+        allow_redirects=False,
+        stream=True,
+    )
+    content, chunks = _read_cacheable_content(upstream_response)
+    if content is None:
+        upstream_response.close()
+        return None, "BYPASS"
+    return store_upstream_response(cache_key, cached_response, upstream_response, content, cache_timeout)
+
+
+async def _aiter_upstream_content(upstream_response, chunk_size, decode=False):
+    iter_content = upstream_response.aiter_bytes if decode else upstream_response.aiter_raw
+    try:
+        async for chunk in iter_content(chunk_size):
+            yield chunk
+    except httpx.TimeoutException as exc:
+        raise GatewayTimeout() from exc
+    except httpx.HTTPError as exc:
+        raise BadGateway() from exc
+    finally:
+        await upstream_response.aclose()
+
+
+async def _adecode_chunks(chunks, content_encoding):
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32)
+    async for chunk in chunks:
+        yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+
+
+async def _achain(buffered, chunks):
+    for chunk in buffered:
+        yield chunk
+    async for chunk in chunks:
+        yield chunk
+
+
+async def _aread_cacheable_content(upstream_response):
+    """
+    Async counterpart of `_read_cacheable_content`.
+    """
+    max_size = settings.OBSTRACT_PROXY_CACHE_MAX_SIZE
+    chunks = _aiter_upstream_content(upstream_response, settings.OBSTRACT_PROXY_CHUNK_SIZE)
+    if _exceeds_cache_size(upstream_response, max_size):
+        return None, chunks
+    buffered = []
+    size = 0
+    async for chunk in chunks:
+        buffered.append(chunk)
+        size += len(chunk)
+        if size > max_size:
+            return None, _achain(buffered, chunks)
+    return b"".join(buffered), None
+
+
+class ObstractsProxyView(APIView):
+    """
+    Forwards requests to the Obstracts service.
+
+    Subclasses set `permission_classes` and implement `get_target_url`. Checks that need more than
+    the permission classes go in `has_proxy_permission`, which either returns False for a plain 403
+    or raises an APIException with its own status and reason. Unauthenticated requests are returned
+    as a bare 401, upstream connection errors as 502, upstream timeouts as 504 and calls rejected by
+    the open circuit breaker as 503.
+
+    Routes with a `cache_route` entry in OBSTRACT_PROXY_CACHE_TTLS serve GETs from the shared
+    response cache, revalidating expired entries with If-None-Match / If-Modified-Since. Concurrent
+    misses for the same entry are coalesced into one upstream request. Bodies larger than
+    OBSTRACT_PROXY_CACHE_MAX_SIZE are streamed and not cached. Routes that set
+    `stale_while_revalidate` answer from an expired entry for up to OBSTRACT_PROXY_STALE_TTL seconds
+    and refresh it with a background task instead.
+    """
+
+    schema = None
+    proxy_methods = ("GET",)
+    # key into OBSTRACT_SERVICE_READ_TIMEOUTS for this route
+    upstream_endpoint = None
+    # explicit (connect, read) timeout for this route, overrides upstream_endpoint
+    proxy_timeout = None
+    # falls back to OBSTRACT_PROXY_STREAMING
+    stream = None
+    # key into OBSTRACT_PROXY_CACHE_TTLS, None disables caching for the route
+    cache_route = None
+    # serve expired cache entries while they are refreshed in the background
+    stale_while_revalidate = False
+
+    def get_target_url(self, request, *args, **kwargs) -> str:
+        raise NotImplementedError
+
+    def has_proxy_permission(self, request) -> bool:
+        return True
+
+    def check_proxy_access(self, request):
+        self.perform_authentication(request)
+        self.check_permissions(request)
+        if not self.has_proxy_permission(request):
+            raise PermissionDenied()
+        self.check_throttles(request)
+
+    def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            self.check_proxy_access(request)
+            if request.method not in self.proxy_methods:
+                raise MethodNotAllowed(request.method)
+            response = self.proxy(request, *args, **kwargs)
+        except (NotAuthenticated, AuthenticationFailed):
+            return HttpResponse(status=401)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    def get_upstream_headers(self, request):
+        headers = {
+            key: value
+            for key, value in request.headers.items()
+            if key.lower() not in EXCLUDED_REQUEST_HEADERS
+        }
+        headers["Accept-Encoding"] = UPSTREAM_ACCEPT_ENCODING
+        return headers
+
+    def get_upstream_params(self, request):
+        return [
+            (key, value)
+            for key, values in request.GET.lists()
+            for value in values
+        ]
+
+    def should_decode(self, request, content_encoding):
+        return bool(content_encoding) and not accepts_encoding(request, content_encoding)
+
+    def should_stream(self, request):
+        if self.stream is None:
+            return settings.OBSTRACT_PROXY_STREAMING
+        return self.stream
+
+    def get_cache_timeout(self, request):
+        if request.method != "GET" or not self.cache_route:
+            return None
+        return settings.OBSTRACT_PROXY_CACHE_TTLS.get(self.cache_route)
+
+    def get_upstream_timeout(self):
+        if self.proxy_timeout is not None:
+            return self.proxy_timeout
+        return client.get_timeout(self.upstream_endpoint)
+
+    def send_upstream(self, request, target_url, stream, headers=None):
+        if headers is None:
+            headers = self.get_upstream_headers(request)
+        try:
+            return client.request(
+                method=request.method,
+                url=target_url,
+                headers=headers,
+                data=request.body,
+                params=self.get_upstream_params(request),
+                allow_redirects=False,
+                stream=stream,
+                timeout=self.get_upstream_timeout(),
+            )
+        except requests.Timeout as exc:
+            raise GatewayTimeout() from exc
+        except requests.RequestException as exc:
+            raise BadGateway() from exc
+
+    def proxy(self, request, *args, **kwargs):
+        target_url = self.get_target_url(request, *args, **kwargs)
+        cache_timeout = self.get_cache_timeout(request)
+        if cache_timeout:
+            return self.proxy_cached(request, target_url, cache_timeout)
+        return self.proxy_uncached(request, target_url)
+
+    def proxy_uncached(self, request, target_url):
+        # the body is always read from the raw stream so compressed responses are not decoded
+        upstream_response = self.send_upstream(request, target_url, True)
+        content_encoding = upstream_response.headers.get("Content-Encoding")
+        decode = self.should_decode(request, content_encoding)
+        content = _iter_upstream_content(upstream_response, settings.OBSTRACT_PROXY_CHUNK_SIZE, decode)
+        if decode:
+            content_encoding = None
+        if self.should_stream(request):
+            return self.build_streaming_response(upstream_response, content, content_encoding)
+        return self.build_response(
+            upstream_response.status_code,
+            b"".join(content),
+            upstream_response.headers.get("Content-Type"),
+            upstream_response.headers,
+            content_encoding,
+        )
+
+    def get_cache_key(self, request, target_url):
+        return get_proxy_cache_key(
+            target_url,
+            self.get_upstream_params(request),
+            vary=[request.headers.get("Accept", "")],
+        )
+
+    def proxy_cached(self, request, target_url, cache_timeout):
+        cache_key = self.get_cache_key(request, target_url)
+        cached_response = get_cached_response(cache_key)
+        if cached_response and cached_response.is_fresh:
+            return self.build_cached_response(request, cached_response, "HIT")
+        if self.can_serve_stale(cached_response):
+            self.schedule_refresh(request, target_url, cache_key, cache_timeout)
+            return self.build_cached_response(request, cached_response, "STALE")
+
+        # concurrent misses for the same key share a single upstream request
+        (cached_response, cache_status), is_leader = single_flight(
+            cache_key,
+            lambda: self.fetch_for_cache(
+                request, target_url, cache_key, cached_response, cache_timeout
+            ),
+        )
+        if cached_response is None:
+            # too large to cache, the leader streams the body it started reading
+            response = self.oversized_response if is_leader else self.proxy_uncached(request, target_url)
+            response["X-Cache"] = cache_status
+            return response
+        if not is_leader:
+            cache_status = "COALESCED"
+        return self.build_cached_response(request, cached_response, cache_status)
+
+    def can_serve_stale(self, cached_response):
+        return bool(
+            self.stale_while_revalidate
+            and cached_response
+            and cached_response.is_servable_stale(settings.OBSTRACT_PROXY_STALE_TTL)
+        )
+
+    def schedule_refresh(self, request, target_url, cache_key, cache_timeout):
+        """
+        Queue a refresh of `cache_key`, unless one is already pending.
+        """
+        from .tasks import refresh_proxy_response
+
+        if not acquire_refresh_lock(cache_key, settings.OBSTRACT_PROXY_REFRESH_LOCK_TIMEOUT):
+            return
+        # the Obstracts service does not authenticate callers, Accept is the only header the entry varies on
+        headers = {"Accept": request.headers["Accept"]} if "Accept" in request.headers else {}
+        try:
+            refresh_proxy_response.delay(
+                cache_key,
+                target_url,
+                self.get_upstream_params(request),
+                headers,
+                cache_timeout,
+                self.upstream_endpoint,
+            )
+        except Exception:
+            # the stale entry is still served, the next request tries again once the lock expires
+            logger.exception("Could not queue proxy cache refresh")
+
+    def fetch_for_cache(self, request, target_url, cache_key, cached_response, cache_timeout):
+        """
+        Fetch `target_url` and store the result in the response cache when it is cacheable.
+
+        Returns a `(CachedResponse, cache status)` tuple. Bodies too large to cache are streamed
+        through `oversized_response` instead and `(None, "BYPASS")` is returned.
+        """
+        upstream_response = self.send_upstream(
+            request,
+            target_url,
+            True,
+            headers=self.get_cache_request_headers(request, cached_response),
+        )
+        content, chunks = _read_cacheable_content(upstream_response)
+        if content is None:
+            self.oversized_response = self.build_oversized_response(request, upstream_response, chunks)
+            return None, "BYPASS"
+        return self.store_for_cache(cache_key, cached_response, upstream_response, content, cache_timeout)
+
+    def get_cache_request_headers(self, request, cached_response):
+        headers = {
+            key: value
+            for key, value in self.get_upstream_headers(request).items()
+            if key.lower() not in CONDITIONAL_REQUEST_HEADERS
+        }
+        if cached_response:
+            headers.update(cached_response.get_validators())
+        return headers
+
+    def store_for_cache(self, cache_key, cached_response, upstream_response, content, cache_timeout):
+        return store_upstream_response(cache_key, cached_response, upstream_response, content, cache_timeout)
+
+    def build_oversized_response(self, request, upstream_response, chunks, decode_chunks=_decode_chunks):
+        content_encoding = upstream_response.headers.get("Content-Encoding")
+        if self.should_decode(request, content_encoding):
+            chunks = decode_chunks(chunks, content_encoding)
+            content_encoding = None
+        return self.build_streaming_response(upstream_response, chunks, content_encoding)
+
+    def build_cached_response(self, request, cached_response: CachedResponse, cache_status):
+        etag = cached_response.etag
+        if etag_matches(etag, request.headers.get("If-None-Match")):
+            response = HttpResponse(status=304)
+            response["ETag"] = etag
+        else:
+            content = cached_response.content
+            content_encoding = cached_response.content_encoding
+            if self.should_decode(request, content_encoding):
+                content = decode_content(content, content_encoding)
+                content_encoding = None
+            response = self.build_response(
+                cached_response.status_code,
+                content,
+                cached_response.content_type,
+                cached_response.headers,
+                content_encoding,
+            )
+        response["X-Cache"] = cache_status
+        return response
+
+    def build_response(self, status_code, content, content_type, headers, content_encoding=None):
+        response = HttpResponse(content, status=status_code, content_type=content_type)
+        self.set_forwarded_headers(response, headers, content_encoding)
+        return response
+
+    def build_streaming_response(self, upstream_response, streaming_content, content_encoding=None):
+        response = StreamingHttpResponse(
+            streaming_content,
+            status=upstream_response.status_code,
+            content_type=upstream_response.headers.get("Content-Type"),
+        )
+        self.set_forwarded_headers(response, upstream_response.headers, content_encoding)
+        return response
+
+    def set_forwarded_headers(self, response, headers, content_encoding=None):
+        for header in FORWARDED_RESPONSE_HEADERS:
+            if header in headers:
+                response[header] = headers[header]
+        if content_encoding:
+            response["Content-Encoding"] = content_encoding
+            patch_vary_headers(response, ("Accept-Encoding",))
+
+
+class AsyncProxyMixin:
+    """
+    Runs an ObstractsProxyView natively under ASGI.
+
+    Authorization still runs in django's sync thread, but the upstream call goes through the pooled
+    httpx.AsyncClient, so a worker is not pinned while waiting on the Obstracts service. Concurrent
+    cache misses are coalesced within the worker's event loop.
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.check_proxy_access)(request)
+            if request.method not in self.proxy_methods:
+                raise MethodNotAllowed(request.method)
+            response = await self.aproxy(request, *args, **kwargs)
+        except (NotAuthenticated, AuthenticationFailed):
+            return HttpResponse(status=401)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def asend_upstream(self, request, target_url, stream, headers=None):
+        if headers is None:
+            headers = self.get_upstream_headers(request)
+        async_client = client.get_async_client()
+        upstream_request = async_client.build_request(
+            method=request.method,
+            url=target_url,
+            headers=headers,
+            content=request.body,
+            params=self.get_upstream_params(request),
+            timeout=client.get_httpx_timeout(self.get_upstream_timeout()),
+        )
+        try:
+            return await client.async_send(async_client, upstream_request, stream=stream)
+        except httpx.TimeoutException as exc:
+            raise GatewayTimeout() from exc
+        except httpx.HTTPError as exc:
+            raise BadGateway() from exc
+
+    async def aproxy(self, request, *args, **kwargs):
+        target_url = self.get_target_url(request, *args, **kwargs)
+        cache_timeout = self.get_cache_timeout(request)
+        if cache_timeout:
+            return await self.aproxy_cached(request, target_url, cache_timeout)
+        return await self.aproxy_uncached(request, target_url)
+
+    async def aproxy_uncached(self, request, target_url):
+        upstream_response = await self.asend_upstream(request, target_url, True)
+        content_encoding = upstream_response.headers.get("Content-Encoding")
+        decode = self.should_decode(request, content_encoding)
+        content = _aiter_upstream_content(upstream_response, settings.OBSTRACT_PROXY_CHUNK_SIZE, decode)
+        if decode:
+            content_encoding = None
+        if self.should_stream(request):
+            return self.build_streaming_response(upstream_response, content, content_encoding)
+        return self.build_response(
+            upstream_response.status_code,
+            b"".join([chunk async for chunk in content]),
+            upstream_response.headers.get("Content-Type"),
+            upstream_response.headers,
+            content_encoding,
+        )
+
+    async def aproxy_cached(self, request, target_url, cache_timeout):
+        cache_key = self.get_cache_key(request, target_url)
+        cached_response = await sync_to_async(get_cached_response, thread_sensitive=False)(cache_key)
+        if cached_response and cached_response.is_fresh:
+            return self.build_cached_response(request, cached_response, "HIT")
+        if self.can_serve_stale(cached_response):
+            await sync_to_async(self.schedule_refresh, thread_sensitive=False)(
+                request, target_url, cache_key, cache_timeout
+            )
+            return self.build_cached_response(request, cached_response, "STALE")
+
+        (cached_response, cache_status), is_leader = await async_single_flight(
+            cache_key,
+            lambda: self.afetch_for_cache(
+                request, target_url, cache_key, cached_response, cache_timeout
+            ),
+        )
+        if cached_response is None:
+            response = self.oversized_response if is_leader else await self.aproxy_uncached(request, target_url)
+            response["X-Cache"] = cache_status
+            return response
+        if not is_leader:
+            cache_status = "COALESCED"
+        return self.build_cached_response(request, cached_response, cache_status)
+
+    async def afetch_for_cache(self, request, target_url, cache_key, cached_response, cache_timeout):
+        upstream_response = await self.asend_upstream(
+            request,
+            target_url,
+            True,
+            headers=self.get_cache_request_headers(request, cached_response),
+        )
+        content, chunks = await _aread_cacheable_content(upstream_response)
+        if content is None:
+            self.oversized_response = self.build_oversized_response(
+                request, upstream_response, chunks, decode_chunks=_adecode_chunks
+            )
+            return None, "BYPASS"
+        return await sync_to_async(self.store_for_cache, thread_sensitive=False)(
+            cache_key, cached_response, upstream_response, content, cache_timeout
+        )
@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FeedSubsription
+from .subscription_index import add_team_feed, remove_team_feed
+
+
+@receiver(post_save, sender=FeedSubsription)
+def feed_subscription_created(sender, instance, created, **kwargs):
+    if not created:
+        return
+    transaction.on_commit(lambda: add_team_feed(instance.team_id, instance.feed_id))
+
+
+@receiver(post_delete, sender=FeedSubsription)
+def feed_subscription_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: remove_team_feed(instance.team_id, instance.feed_id))
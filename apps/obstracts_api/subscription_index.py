@@ -0,0 +1,113 @@
+import logging
+import uuid
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import WatchError
+
+from .models import FeedSubsription
+
+logger = logging.getLogger("obstracts_web.obstracts_api")
+
+TEAM_FEEDS_KEY = 'obstracts_api.team_feeds'
+# bumped on every change to a team's set, a build only stores what it read when no change happened meanwhile
+TEAM_FEEDS_VERSION_KEY = 'obstracts_api.team_feeds_version'
+# member marking a team's set as complete, a set without it is built from the database before use
+INDEX_COMPLETE = '*'
+
+
+def _normalize_id(value):
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def _get_team_feeds_key(team_id):
+    return f'{TEAM_FEEDS_KEY}:{_normalize_id(team_id) or team_id}'
+
+
+def _get_team_feeds_version_key(team_id):
+    return f'{TEAM_FEEDS_VERSION_KEY}:{_normalize_id(team_id) or team_id}'
+
+
+def build_team_feed_index(team_id) -> set:
+    """
+    Replaces the team's redis set with the feed ids it is subscribed to in the database.
+
+    The set is only stored when no subscription of the team changed between reading the version
+    and writing the set, otherwise a feed removed meanwhile could be added back. It is then left
+    incomplete and built again on next use.
+    """
+    connection = get_redis_connection('default')
+    key = _get_team_feeds_key(team_id)
+    version_key = _get_team_feeds_version_key(team_id)
+    version = connection.get(version_key)
+    feed_ids = {
+        str(feed_id)
+        for feed_id in FeedSubsription.objects.filter(team_id=team_id).values_list('feed_id', flat=True)
+    }
+    with connection.pipeline() as pipeline:
+        try:
+            pipeline.watch(version_key)
+            if pipeline.get(version_key) != version:
+                raise WatchError()
+            pipeline.multi()
+            pipeline.delete(key)
+            pipeline.sadd(key, INDEX_COMPLETE, *feed_ids)
+            pipeline.expire(key, settings.TEAM_FEED_INDEX_TTL)
+            pipeline.execute()
+        except WatchError:
+            logger.info(f"Subscriptions of team {team_id} changed while building its feed index")
+    return feed_ids
+
+
+def _update_team_feeds(team_id, command, feed_id):
+    pipeline = get_redis_connection('default').pipeline()
+    getattr(pipeline, command)(_get_team_feeds_key(team_id), _normalize_id(feed_id) or str(feed_id))
+    pipeline.incr(_get_team_feeds_version_key(team_id))
+    pipeline.expire(_get_team_feeds_version_key(team_id), settings.TEAM_FEED_INDEX_TTL)
+    pipeline.execute()
+
+
+def is_team_subscribed(team_id, feed_id) -> bool:
+    feed_id = _normalize_id(feed_id)
+    if feed_id is None:
+        return False
+    try:
+        pipeline = get_redis_connection('default').pipeline(transaction=False)
+        pipeline.sismember(_get_team_feeds_key(team_id), INDEX_COMPLETE)
+        pipeline.sismember(_get_team_feeds_key(team_id), feed_id)
+        is_complete, is_member = pipeline.execute()
+        if is_complete:
+            return bool(is_member)
+        return feed_id in build_team_feed_index(team_id)
+    except Exception:
+        logger.exception("Team feed index unavailable")
+        return FeedSubsription.objects.filter(team_id=team_id, feed_id=feed_id).exists()
+
+
+def add_team_feed(team_id, feed_id):
+    # an incomplete set is completed from the database on first use, so ids can always be added
+    try:
+        _update_team_feeds(team_id, 'sadd', feed_id)
+    except Exception:
+        logger.exception(f"Could not add feed {feed_id} to the index of team {team_id}")
+
+
+def remove_team_feed(team_id, feed_id):
+    try:
+        _update_team_feeds(team_id, 'srem', feed_id)
+    except Exception:
+        # the index keeps the feed until it expires or `rebuild_team_feed_index` is run
+        logger.exception(f"Could not remove feed {feed_id} from the index of team {team_id}")
+
+
+def rebuild_team_feed_indexes(team_ids=None):
+    if team_ids is None:
+        team_ids = FeedSubsription.objects.values_list('team_id', flat=True).distinct()
+    count = 0
+    for team_id in team_ids:
+        build_team_feed_index(team_id)
+        count += 1
+    return count
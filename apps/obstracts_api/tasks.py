@@ -1,7 +1,11 @@
 from datetime import timedelta
+from django.conf import settings
 from django.utils import timezone
 from celery import shared_task
+from .cache import invalidate_cached_posts, release_refresh_lock
 from .models import Feed
+from .post_index import sync_feed_posts as sync_post_index
+from .proxy import refresh_cached_response
 from .utils import init_reload_feed, get_obstracts_job, get_obstracts_feed
 
 
@@ -44,6 +48,10 @@ def update_feed(feed_id):
     feed.obstract_feed_metadata = get_obstracts_feed(feed_id)
     if job["state"] in ["processed", "processing_failed", "retrieve_failed"]:
         feed.active_job_id = None
+        # the job may have added or reprocessed posts
+        invalidate_cached_posts(feed_id)
+        if settings.OBSTRACT_LOCAL_POSTS:
+            sync_feed_posts.delay(feed_id)
     feed.save()
 
 
@@ -52,3 +60,16 @@ def sync_feed_updates():
     feeds = Feed.objects.exclude(active_job_id=None)
     for feed in feeds:
         update_feed.delay(feed.id)
+
+
+@shared_task()
+def sync_feed_posts(feed_id, full=False):
+    sync_post_index(feed_id, full=full)
+
+
+@shared_task(ignore_result=True)
+def refresh_proxy_response(cache_key, target_url, params, headers, cache_timeout, endpoint=None):
+    try:
+        refresh_cached_response(cache_key, target_url, params, headers, cache_timeout, endpoint)
+    finally:
+        release_refresh_lock(cache_key)
@@ -1,3 +1,1069 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import importlib
+import threading
+import time
+import uuid
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+from asgiref.sync import iscoroutinefunction
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.db.models import IntegerField
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django_redis import get_redis_connection
+from djstripe.models import Subscription
+from requests.structures import CaseInsensitiveDict
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.subscriptions.metadata import ProductMetadata
+from apps.subscriptions.tests.utils import create_subscription_for_team
+from apps.teams.models import Team
+from apps.teams.roles import ROLE_MEMBER, invalidate_team_roles
+from apps.users.models import CustomUser
+
+from . import client, subscription_index, tasks
+from .breaker import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, CircuitBreaker
+from .cache import CachedResponse, get_feed_set_hash, get_proxy_cache_key, invalidate_cached_posts
+from .coalesce import _redis_single_flight, async_single_flight, single_flight
+from .exceptions import CircuitOpen
+from .models import Feed, FeedPost, FeedSubsription
+from .pagination import KeysetPagination
+from .post_index import get_feed_post_queryset, sync_feed_posts
+from .proxy import AsyncProxyMixin, _read_cacheable_content, accepts_encoding, decode_content, etag_matches
+from .subscription_index import is_team_subscribed, rebuild_team_feed_indexes
+from .utils import get_posts
+from .views import (
+    AsyncProxyView,
+    LatestPostView,
+    OpenFeedProxyView,
+    PostsByExtractionView,
+    ProxyView,
+    TeamFeedProxyView,
+    sort_feed_queryset,
+)
+
+
+class ProxyCacheKeyTest(SimpleTestCase):
+    def test_query_param_order_is_ignored(self):
+        self.assertEqual(
+            get_proxy_cache_key("/feeds/1/posts/", [("page", "2"), ("sort", "pubdate")]),
+            get_proxy_cache_key("/feeds/1/posts/", [("sort", "pubdate"), ("page", "2")]),
+        )
+
+    def test_different_paths_and_vary_values(self):
+        key = get_proxy_cache_key("/feeds/1/posts/", [], vary=["application/json"])
+        self.assertNotEqual(key, get_proxy_cache_key("/feeds/2/posts/", [], vary=["application/json"]))
+        self.assertNotEqual(key, get_proxy_cache_key("/feeds/1/posts/", [], vary=["text/markdown"]))
+
+    def test_escaped_separators_do_not_collide(self):
+        self.assertNotEqual(
+            get_proxy_cache_key("/feeds/1/posts/", [("page", "2&title=a")]),
+            get_proxy_cache_key("/feeds/1/posts/", [("page", "2"), ("title", "a")]),
+        )
+
+
+class FeedSetHashTest(SimpleTestCase):
+    def test_order_and_repetitions_are_ignored(self):
+        feed_ids = [uuid.UUID(int=1), uuid.UUID(int=2)]
+        self.assertEqual(get_feed_set_hash(feed_ids), get_feed_set_hash([str(feed_ids[1]), *feed_ids]))
+        self.assertNotEqual(get_feed_set_hash(feed_ids), get_feed_set_hash(feed_ids[:1]))
+
+
+class CachedResponseTest(SimpleTestCase):
+    def test_validators(self):
+        cached_response = CachedResponse(
+            status_code=200,
+            content=b"{}",
+            headers={"ETag": '"abc"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"},
+        )
+        self.assertEqual(
+            cached_response.get_validators(),
+            {"If-None-Match": '"abc"', "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"},
+        )
+        self.assertEqual(CachedResponse(status_code=200, content=b"").get_validators(), {})
+
+    def test_freshness(self):
+        cached_response = CachedResponse(status_code=200, content=b"")
+        self.assertFalse(cached_response.is_fresh)
+        cached_response.refresh(60)
+        self.assertTrue(cached_response.is_fresh)
+        cached_response.fresh_until = time.time() - 1
+        self.assertFalse(cached_response.is_fresh)
+
+    def test_servable_stale(self):
+        cached_response = CachedResponse(status_code=200, content=b"", fresh_until=time.time() - 10)
+        self.assertTrue(cached_response.is_servable_stale(60))
+        self.assertFalse(cached_response.is_servable_stale(5))
+
+
+@override_settings(OBSTRACT_PROXY_COALESCE="local", OBSTRACT_PROXY_COALESCE_TIMEOUT=5)
+class SingleFlightTest(SimpleTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        calls = []
+        release = threading.Event()
+        results = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return "response"
+
+        threads = [
+            threading.Thread(target=lambda: results.append(single_flight("key", fetch)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, _ in results], ["response"] * 5)
+        self.assertEqual(sum(1 for _, is_leader in results if is_leader), 1)
+
+    def run_leader_and_follower(self, fetch, flight=single_flight):
+        """
+        Starts a follower once the leader is inside `fetch`, returns the errors both callers raised.
+        """
+        errors = []
+        in_fetch = threading.Event()
+
+        def call(fn):
+            try:
+                flight("key", fn)
+            except ValueError as exc:
+                errors.append(exc)
+
+        def leader_fetch():
+            in_fetch.set()
+            return fetch()
+
+        leader = threading.Thread(target=call, args=(leader_fetch,))
+        leader.start()
+        in_fetch.wait(5)
+        follower = threading.Thread(target=call, args=(fetch,))
+        follower.start()
+        leader.join()
+        follower.join()
+        return errors
+
+    def test_leader_error_is_shared(self):
+        calls = []
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            raise ValueError()
+
+        threading.Timer(0.2, release.set).start()
+        errors = self.run_leader_and_follower(fetch)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(errors), 2)
+
+    @override_settings(OBSTRACT_PROXY_COALESCE_POLL_INTERVAL=0.01)
+    def test_redis_leader_error_is_published(self):
+        calls = []
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            raise ValueError()
+
+        cache.delete_many(["obstracts_api.coalesce:result:key", "obstracts_api.coalesce:lock:key"])
+        threading.Timer(0.2, release.set).start()
+        started = time.monotonic()
+        # called directly, as workers in different processes would
+        errors = self.run_leader_and_follower(fetch, flight=_redis_single_flight)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(errors), 2)
+        self.assertLess(time.monotonic() - started, 5)
+
+
+@override_settings(OBSTRACT_PROXY_COALESCE="local", OBSTRACT_PROXY_COALESCE_TIMEOUT=5)
+class AsyncSingleFlightTest(SimpleTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "response"
+
+        async def run():
+            return await asyncio.gather(*[async_single_flight("key", fetch) for _ in range(5)])
+
+        results = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, _ in results], ["response"] * 5)
+
+    def test_cancelled_leader_does_not_block_followers(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0 if len(calls) > 1 else 10)
+            return "response"
+
+        async def run():
+            leader = asyncio.create_task(async_single_flight("key", fetch))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(async_single_flight("key", fetch))
+            await asyncio.sleep(0)
+            leader.cancel()
+            result = await asyncio.wait_for(follower, 1)
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return result
+
+        self.assertEqual(asyncio.run(run()), ("response", True))
+        self.assertEqual(len(calls), 2)
+
+
+@mock.patch("apps.obstracts_api.breaker.publish_snapshot")
+class CircuitBreakerTest(SimpleTestCase):
+    def get_breaker(self):
+        return CircuitBreaker(
+            "test", failure_rate=0.5, minimum_calls=4, window=60, reset_timeout=30, half_open_calls=1
+        )
+
+    def record_failures(self, breaker, times):
+        for _ in range(times):
+            breaker.record_failure(probe=breaker.before_call())
+
+    def test_opens_once_failure_rate_is_reached(self, _publish):
+        breaker = self.get_breaker()
+        self.record_failures(breaker, 3)
+        self.assertEqual(breaker.state, STATE_CLOSED)
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, STATE_OPEN)
+        with self.assertRaises(CircuitOpen) as context:
+            breaker.before_call()
+        self.assertTrue(context.exception.wait)
+        self.assertEqual(breaker.snapshot()["rejected"], 1)
+
+    def test_probe_after_reset_timeout(self, _publish):
+        breaker = self.get_breaker()
+        self.record_failures(breaker, 4)
+        breaker.opened_at -= 31
+        probe = breaker.before_call()
+        self.assertTrue(probe)
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+        breaker.record_success(probe=probe)
+        self.assertEqual(breaker.state, STATE_CLOSED)
+        self.assertEqual(breaker.snapshot()["window_calls"], 0)
+
+    def test_failed_probe_opens_again(self, _publish):
+        breaker = self.get_breaker()
+        self.record_failures(breaker, 4)
+        breaker.opened_at -= 31
+        self.record_failures(breaker, 1)
+        self.assertEqual(breaker.state, STATE_OPEN)
+
+    @override_settings(OBSTRACT_CIRCUIT_BREAKER_ENABLED=True)
+    def test_cancelled_probe_is_released(self, _publish):
+        breaker = self.get_breaker()
+        self.record_failures(breaker, 4)
+        breaker.opened_at -= 31
+        async_client = mock.Mock(send=mock.AsyncMock(side_effect=asyncio.CancelledError()))
+        with mock.patch("apps.obstracts_api.client.get_breaker", return_value=breaker):
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(client.async_send(async_client, mock.Mock()))
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+        # the next call is let through as a probe
+        breaker.record_success(probe=breaker.before_call())
+        self.assertEqual(breaker.state, STATE_CLOSED)
+
+    def test_calls_started_before_opening_do_not_decide_the_probe(self, _publish):
+        breaker = self.get_breaker()
+        in_flight = [breaker.before_call() for _ in range(2)]
+        self.record_failures(breaker, 4)
+        breaker.opened_at -= 31
+        probe = breaker.before_call()
+        breaker.record_success(probe=in_flight[0])
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+        breaker.record_failure(probe=in_flight[1])
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+        breaker.record_success(probe=probe)
+        self.assertEqual(breaker.state, STATE_CLOSED)
+
+    def test_old_outcomes_leave_the_window(self, _publish):
+        breaker = self.get_breaker()
+        with mock.patch("apps.obstracts_api.breaker.time.time", return_value=1_700_000_000):
+            self.record_failures(breaker, 3)
+        with mock.patch("apps.obstracts_api.breaker.time.time", return_value=1_700_000_061):
+            breaker.record_failure(probe=breaker.before_call())
+        snapshot = breaker.snapshot()
+        self.assertEqual((snapshot["window_calls"], snapshot["window_failures"]), (1, 1))
+        self.assertEqual(breaker.state, STATE_CLOSED)
+
+
+class ContentEncodingTest(SimpleTestCase):
+    def get_request(self, accept_encoding):
+        return RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+
+    def test_accepts_encoding(self):
+        self.assertTrue(accepts_encoding(self.get_request("gzip, deflate, br"), "gzip"))
+        self.assertTrue(accepts_encoding(self.get_request("br;q=1.0, *;q=0.5"), "gzip"))
+        self.assertFalse(accepts_encoding(self.get_request("gzip;q=0, br"), "gzip"))
+        self.assertFalse(accepts_encoding(self.get_request("identity"), "gzip"))
+        self.assertFalse(accepts_encoding(RequestFactory().get("/"), "gzip"))
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"abc"', '"xyz", "abc"'))
+        self.assertTrue(etag_matches('"abc"', 'W/"abc"'))
+        self.assertTrue(etag_matches('"abc"', "*"))
+        self.assertFalse(etag_matches('"abc"', '"abcd"'))
+        self.assertFalse(etag_matches('"ab"', '"xabc"'))
+        self.assertFalse(etag_matches(None, "*"))
+
+    def test_decode_content(self):
+        self.assertEqual(decode_content(gzip.compress(b"{}"), "gzip"), b"{}")
+        self.assertEqual(decode_content(b"{}", None), b"{}")
+
+
+@override_settings(OBSTRACT_PROXY_CACHE_MAX_SIZE=10, OBSTRACT_PROXY_CHUNK_SIZE=4)
+class CacheableContentTest(SimpleTestCase):
+    def get_upstream_response(self, content, headers=None):
+        upstream_response = mock.Mock(headers=headers or {})
+        upstream_response.raw.stream.return_value = iter([content[i: i + 4] for i in range(0, len(content), 4)])
+        return upstream_response
+
+    def test_small_bodies_are_read(self):
+        content, chunks = _read_cacheable_content(self.get_upstream_response(b"0123456789"))
+        self.assertEqual(content, b"0123456789")
+        self.assertIsNone(chunks)
+
+    def test_large_bodies_are_streamed_whole(self):
+        content, chunks = _read_cacheable_content(self.get_upstream_response(b"0123456789ab"))
+        self.assertIsNone(content)
+        self.assertEqual(b"".join(chunks), b"0123456789ab")
+
+    def test_content_length_skips_buffering(self):
+        upstream_response = self.get_upstream_response(b"0123456789ab", {"Content-Length": "12"})
+        content, chunks = _read_cacheable_content(upstream_response)
+        self.assertIsNone(content)
+        self.assertEqual(b"".join(chunks), b"0123456789ab")
+
+
+class FeedMetadataFieldsTest(TestCase):
+    def create_feed(self, **metadata):
+        return Feed.objects.create(obstract_feed_metadata=metadata, job_metadata={})
+
+    def test_save_copies_metadata(self):
+        feed = self.create_feed(title="Threat Blog", count_of_posts=12, latest_item_pubdate="not a date")
+        feed.refresh_from_db()
+        self.assertEqual(feed.metadata_title, "Threat Blog")
+        self.assertEqual(feed.metadata_count_of_posts, 12)
+        self.assertIsNone(feed.metadata_latest_item_pubdate)
+
+        feed.obstract_feed_metadata = {"title": "Renamed"}
+        feed.save(update_fields=["obstract_feed_metadata"])
+        feed.refresh_from_db()
+        self.assertEqual(feed.metadata_title, "Renamed")
+        self.assertIsNone(feed.metadata_count_of_posts)
+
+    def test_backfill(self):
+        feed = self.create_feed(title="Threat Blog", datetime_added="2024-01-01T00:00:00Z")
+        # rows written before the columns existed
+        Feed.objects.filter(id=feed.id).update(metadata_title=None, metadata_datetime_added=None)
+        migration = importlib.import_module("apps.obstracts_api.migrations.0008_feed_metadata_columns")
+        migration.backfill_metadata_fields(django_apps, None)
+        feed.refresh_from_db()
+        self.assertEqual(feed.metadata_title, "Threat Blog")
+        self.assertEqual(feed.metadata_datetime_added.year, 2024)
+
+    def test_sort_and_title_search(self):
+        for title, count_of_posts in [("Alpha Threats", 3), ("beta threats", 1), ("Gamma", 2)]:
+            self.create_feed(title=title, count_of_posts=count_of_posts)
+        feeds = sort_feed_queryset(Feed.objects.all(), "-count_of_posts")
+        self.assertEqual([feed.metadata_title for feed in feeds], ["Alpha Threats", "Gamma", "beta threats"])
+        feeds = sort_feed_queryset(Feed.objects.filter(metadata_title__icontains="THREAT"), "count_of_posts")
+        self.assertEqual([feed.metadata_title for feed in feeds], ["beta threats", "Alpha Threats"])
+        # unknown keys leave the queryset unordered rather than failing
+        self.assertFalse(sort_feed_queryset(Feed.objects.all(), "-unknown").query.order_by)
+
+    def test_title_sort_uses_the_indexed_prefix(self):
+        for title in ["Gamma", None, "Alpha"]:
+            self.create_feed(title=title)
+        feeds = sort_feed_queryset(Feed.objects.all(), "title")
+        self.assertEqual(feeds.query.order_by, ("sort_title",))
+        self.assertIn('LEFT("obstracts_api_feed"."metadata_title", 255)', str(feeds.query))
+        self.assertEqual([feed.metadata_title for feed in feeds], ["Alpha", "Gamma", None])
+
+
+class KeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for count_of_posts in [3, 1, None, 2, 2]:
+            Feed.objects.create(obstract_feed_metadata={"count_of_posts": count_of_posts}, job_metadata={})
+
+    def get_queryset(self, order_by):
+        return Feed.objects.annotate(
+            sort_count_of_posts=Cast(KT("obstract_feed_metadata__count_of_posts"), IntegerField())
+        ).order_by(order_by)
+
+    def paginate(self, order_by, **params):
+        pagination = KeysetPagination()
+        pagination.page_size = 2
+        request = Request(RequestFactory().get("/", params))
+        page = pagination.paginate_queryset(self.get_queryset(order_by), request)
+        return page, pagination
+
+    def read_all(self, order_by):
+        feeds, cursor = [], ""
+        while cursor is not None:
+            page, pagination = self.paginate(order_by, cursor=cursor)
+            feeds += page
+            cursor = pagination.next_cursor
+        return feeds
+
+    def test_cursor_pages_follow_the_ordering(self):
+        for order_by, pk_order in [("sort_count_of_posts", "pk"), ("-sort_count_of_posts", "-pk")]:
+            with self.subTest(order_by=order_by):
+                expected = self.get_queryset(order_by).order_by(order_by, pk_order)
+                self.assertEqual(
+                    [feed.pk for feed in self.read_all(order_by)],
+                    [feed.pk for feed in expected],
+                )
+
+    def test_without_count(self):
+        page, pagination = self.paginate("sort_count_of_posts", count="false", page=3)
+        self.assertEqual(len(page), 1)
+        self.assertIsNone(pagination.get_next_link())
+        response = pagination.get_paginated_response([])
+        self.assertNotIn("count", response.data)
+
+
+@override_settings(
+    OBSTRACT_SERVICE_FANOUT_WORKERS=4,
+    OBSTRACT_SERVICE_FANOUT_TIMEOUT=5,
+    OBSTRACT_POST_CACHE_TTL=60,
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class GetPostsTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch("apps.obstracts_api.utils.get_post")
+    def test_order_is_kept_and_failures_are_left_out(self, get_post):
+        def fetch(feed_id, post_id):
+            if post_id == "failing":
+                raise ValueError()
+            # later posts answer first
+            time.sleep(0.05 if post_id == "1" else 0)
+            return {"id": post_id, "feed_id": feed_id}
+
+        get_post.side_effect = fetch
+        posts = get_posts([("feed", "1"), ("feed", "failing"), ("feed", "2"), ("feed", "3")])
+        self.assertEqual([post["id"] for post in posts], ["1", "2", "3"])
+
+    @mock.patch("apps.obstracts_api.utils.get_post")
+    def test_posts_are_cached_until_the_feed_is_invalidated(self, get_post):
+        get_post.side_effect = lambda feed_id, post_id: {"id": post_id, "feed_id": feed_id}
+        get_posts([("feed", "1"), ("other", "1")])
+        self.assertEqual(get_post.call_count, 2)
+
+        posts = get_posts([("other", "1"), ("feed", "1"), ("feed", "2")])
+        self.assertEqual([(post["feed_id"], post["id"]) for post in posts], [("other", "1"), ("feed", "1"), ("feed", "2")])
+        self.assertEqual(get_post.call_count, 3)
+
+        invalidate_cached_posts("feed")
+        get_posts([("feed", "1"), ("other", "1")])
+        self.assertEqual(get_post.call_count, 4)
+
+
+@override_settings(OBSTRACT_POST_SYNC_PAGE_SIZE=2)
+class FeedPostIndexTest(TestCase):
+    def setUp(self):
+        self.feed = Feed.objects.create(obstract_feed_metadata={}, job_metadata={})
+        # most recently updated first, as requested from the Obstracts service
+        self.posts = [
+            {
+                "id": str(uuid.UUID(int=i)),
+                "title": f"post {i}",
+                "pubdate": f"2024-01-0{i}T00:00:00Z",
+                "datetime_updated": f"2024-02-0{i}T00:00:00Z",
+            }
+            for i in [5, 4, 3, 2, 1]
+        ]
+
+    def get_feed_posts(self, feed_id, page, page_size, sort=None):
+        start = (page - 1) * page_size
+        return {"posts": [dict(post) for post in self.posts[start: start + page_size]]}
+
+    def test_incremental_sync_stops_at_known_posts(self):
+        with mock.patch("apps.obstracts_api.post_index.get_feed_posts", side_effect=self.get_feed_posts) as get_feed_posts:
+            self.assertEqual(sync_feed_posts(self.feed.id), 5)
+            self.assertEqual(get_feed_posts.call_count, 3)
+
+            self.posts.insert(0, {"id": str(uuid.UUID(int=6)), "title": "post 6", "datetime_updated": "2024-02-06T00:00:00Z"})
+            get_feed_posts.reset_mock()
+            sync_feed_posts(self.feed.id)
+            self.assertEqual(get_feed_posts.call_count, 2)
+        self.assertEqual(FeedPost.objects.filter(feed=self.feed).count(), 6)
+
+    def test_full_sync_removes_deleted_posts(self):
+        with mock.patch("apps.obstracts_api.post_index.get_feed_posts", side_effect=self.get_feed_posts):
+            sync_feed_posts(self.feed.id)
+            del self.posts[0]
+            sync_feed_posts(self.feed.id, full=True)
+        self.assertEqual(FeedPost.objects.filter(feed=self.feed).count(), 4)
+
+    def test_queryset(self):
+        with mock.patch("apps.obstracts_api.post_index.get_feed_posts", side_effect=self.get_feed_posts):
+            sync_feed_posts(self.feed.id)
+        queryset = get_feed_post_queryset([self.feed.id], "pubdate_ascending", title="POST")
+        self.assertEqual([post.title for post in queryset], [f"post {i}" for i in [1, 2, 3, 4, 5]])
+        self.assertFalse(get_feed_post_queryset([], "pubdate_ascending").exists())
+
+    def test_title_sort_uses_the_indexed_prefix(self):
+        with mock.patch("apps.obstracts_api.post_index.get_feed_posts", side_effect=self.get_feed_posts):
+            sync_feed_posts(self.feed.id)
+        queryset = get_feed_post_queryset([self.feed.id], "title_descending")
+        self.assertIn('LEFT("obstracts_api_feedpost"."title", 255)', str(queryset.query))
+        self.assertEqual([post.title for post in queryset], [f"post {i}" for i in [5, 4, 3, 2, 1]])
+
+
+class TeamFeedIndexTest(TestCase):
+    def setUp(self):
+        self.team = Team.objects.create(name="Team", slug="team")
+        self.feed = Feed.objects.create(obstract_feed_metadata={}, job_metadata={})
+        self.other_feed = Feed.objects.create(obstract_feed_metadata={}, job_metadata={})
+        self.connection = get_redis_connection("default")
+        self.keys = [
+            subscription_index._get_team_feeds_key(self.team.id),
+            subscription_index._get_team_feeds_version_key(self.team.id),
+        ]
+        self.connection.delete(*self.keys)
+
+    def tearDown(self):
+        self.connection.delete(*self.keys)
+
+    def is_complete(self):
+        return self.connection.sismember(self.keys[0], subscription_index.INDEX_COMPLETE)
+
+    def test_miss_builds_the_index(self):
+        FeedSubsription.objects.create(team=self.team, feed=self.feed)
+        self.connection.delete(*self.keys)
+        self.assertTrue(is_team_subscribed(self.team.id, self.feed.id))
+        self.assertTrue(self.is_complete())
+        self.assertFalse(is_team_subscribed(str(self.team.id).upper(), self.other_feed.id))
+        self.assertFalse(is_team_subscribed(self.team.id, "not-a-uuid"))
+
+    def test_subscribe_and_unsubscribe(self):
+        self.assertFalse(is_team_subscribed(self.team.id, self.feed.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            subscription = FeedSubsription.objects.create(team=self.team, feed=self.feed)
+        self.assertTrue(is_team_subscribed(self.team.id, self.feed.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            subscription.delete()
+        self.assertFalse(is_team_subscribed(self.team.id, self.feed.id))
+
+    def test_rebuild_replaces_the_index(self):
+        subscription_index.add_team_feed(self.team.id, self.other_feed.id)
+        FeedSubsription.objects.create(team=self.team, feed=self.feed)
+        self.assertEqual(rebuild_team_feed_indexes([self.team.id]), 1)
+        self.assertTrue(is_team_subscribed(self.team.id, self.feed.id))
+        self.assertFalse(is_team_subscribed(self.team.id, self.other_feed.id))
+
+    def test_unsubscribe_during_build_is_not_undone(self):
+        FeedSubsription.objects.create(team=self.team, feed=self.feed)
+        feed_ids = [self.feed.id]
+
+        def filter_and_unsubscribe(**kwargs):
+            # the subscription is read, then removed before the set is written
+            subscription_index.remove_team_feed(self.team.id, self.feed.id)
+            return mock.Mock(values_list=mock.Mock(return_value=feed_ids))
+
+        with mock.patch.object(subscription_index.FeedSubsription.objects, "filter", side_effect=filter_and_unsubscribe):
+            subscription_index.build_team_feed_index(self.team.id)
+        self.assertFalse(self.is_complete())
+        self.assertFalse(self.connection.sismember(self.keys[0], str(self.feed.id)))
+
+
+class TeamFeedProxyAccessTest(TestCase):
+    def setUp(self):
+        self.team = Team.objects.create(name="Team", slug="team")
+        self.feed = Feed.objects.create(obstract_feed_metadata={}, job_metadata={})
+        FeedSubsription.objects.create(team=self.team, feed=self.feed)
+        self.user = CustomUser.objects.create(username="user@example.com", email="user@example.com")
+        invalidate_team_roles(self.user.pk)
+
+    def subscribe_team(self):
+        subscription = create_subscription_for_team(
+            self.team, ProductMetadata(stripe_id="prod_team", slug="product", name="Product", features=[])
+        )
+        # update() skips the Subscription receivers, which expect a plan on the saved subscription
+        Subscription.objects.filter(pk=subscription.pk).update(plan=subscription.items.get().plan)
+
+    @mock.patch.object(TeamFeedProxyView, "proxy", return_value=HttpResponse(b"{}"))
+    def get(self, _proxy, team_id=None, feed_id=None):
+        request = APIRequestFactory().get("/")
+        force_authenticate(request, user=self.user)
+        return TeamFeedProxyView.as_view()(
+            request, team_id=team_id or str(self.team.id), feed_id=feed_id or str(self.feed.id), path="posts/"
+        )
+
+    def assertRefused(self, response, status_code, code):
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(response.data["detail"].code, code)
+
+    def test_unknown_team(self):
+        self.assertRefused(self.get(team_id=str(uuid.uuid4())), 404, "team_not_found")
+
+    def test_not_a_member(self):
+        self.subscribe_team()
+        self.assertRefused(self.get(), 403, "not_team_member")
+
+    def test_member_of_a_team_without_subscription(self):
+        self.team.members.add(self.user, through_defaults={"role": ROLE_MEMBER})
+        self.assertRefused(self.get(), 403, "subscription_required")
+
+    def test_feed_outside_the_subscription(self):
+        self.subscribe_team()
+        self.team.members.add(self.user, through_defaults={"role": ROLE_MEMBER})
+        other_feed = Feed.objects.create(obstract_feed_metadata={}, job_metadata={})
+        self.assertRefused(self.get(feed_id=str(other_feed.id)), 403, "feed_not_subscribed")
+
+    def test_unauthenticated(self):
+        response = TeamFeedProxyView.as_view()(
+            APIRequestFactory().get("/"), team_id=str(self.team.id), feed_id=str(self.feed.id), path="posts/"
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_allowed(self):
+        self.subscribe_team()
+        self.team.members.add(self.user, through_defaults={"role": ROLE_MEMBER})
+        self.assertEqual(self.get().status_code, 200)
+
+    def test_allowed_from_the_cache(self):
+        self.subscribe_team()
+        self.team.members.add(self.user, through_defaults={"role": ROLE_MEMBER})
+        self.assertEqual(self.get().status_code, 200)
+        rebuild_team_feed_indexes([self.team.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get().status_code, 200)
+
+    def test_membership_changes_are_seen(self):
+        self.subscribe_team()
+        self.assertRefused(self.get(), 403, "not_team_member")
+        self.team.members.add(self.user, through_defaults={"role": ROLE_MEMBER})
+        self.assertEqual(self.get().status_code, 200)
+        with mock.patch("apps.teams.receivers.update_user_teams_on_auth0"):
+            self.team.members.remove(self.user)
+        self.assertRefused(self.get(), 403, "not_team_member")
+
+
+class LatestPostViewTest(TestCase):
+    def setUp(self):
+        self.team = Team.objects.create(name="Team", slug="team")
+        self.feed = Feed.objects.create(obstract_feed_metadata={"title": "Threat Blog"}, job_metadata={})
+        FeedSubsription.objects.create(team=self.team, feed=self.feed)
+        self.user = CustomUser.objects.create(username="user@example.com", email="user@example.com")
+        for i in [1, 2, 3]:
+            metadata = {
+                "id": str(uuid.UUID(int=i)),
+                "title": f"post {i}",
+                "pubdate": f"2024-01-0{i}T00:00:00Z",
+                "feed_id": str(self.feed.id),
+            }
+            FeedPost.from_metadata(self.feed.id, metadata).save()
+
+    def get(self, team_id=None, **params):
+        request = APIRequestFactory().get("/", params)
+        force_authenticate(request, user=self.user)
+        kwargs = {"team_id": team_id} if team_id else {}
+        return LatestPostView.as_view()(request, **kwargs)
+
+    @override_settings(OBSTRACT_LOCAL_POSTS=True)
+    def test_local_posts(self):
+        with mock.patch("apps.obstracts_api.views.get_latest_posts") as get_latest_posts:
+            response = self.get(self.team.id)
+        get_latest_posts.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post["title"] for post in response.data["posts"]], ["post 3", "post 2", "post 1"])
+        self.assertEqual({post["feed_title"] for post in response.data["posts"]}, {"Threat Blog"})
+        self.assertEqual(response.data["total_results_count"], 3)
+
+    @override_settings(OBSTRACT_LOCAL_POSTS=True)
+    def test_local_posts_unknown_sort(self):
+        self.assertEqual(self.get(self.team.id, sort="unknown").status_code, 400)
+
+    @override_settings(OBSTRACT_LOCAL_POSTS=False)
+    def test_upstream_posts(self):
+        posts = {"page_size": 10, "posts": [{"id": str(uuid.UUID(int=9)), "feed_id": str(self.feed.id)}]}
+        with mock.patch("apps.obstracts_api.views.get_latest_posts", return_value=posts) as get_latest_posts:
+            response = self.get(self.team.id, title="post", page="2")
+        get_latest_posts.assert_called_once_with([self.feed.id], "pubdate_descending", "post", "2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["posts"][0]["feed_title"], "Threat Blog")
+
+    def test_all_posts_need_staff(self):
+        self.assertEqual(self.get().status_code, 403)
+
+
+class UpdateFeedTaskTest(TestCase):
+    def setUp(self):
+        self.feed = Feed.objects.create(obstract_feed_metadata={}, job_metadata={"id": "job"}, active_job_id=uuid.uuid4())
+
+    def update_feed(self, state):
+        with (
+            mock.patch.object(tasks, "get_obstracts_job", return_value={"id": "job", "state": state}),
+            mock.patch.object(tasks, "get_obstracts_feed", return_value={"title": "Threat Blog"}),
+            mock.patch.object(tasks.sync_feed_posts, "delay") as delay,
+        ):
+            tasks.update_feed(self.feed.id)
+        return delay
+
+    @override_settings(OBSTRACT_LOCAL_POSTS=True)
+    def test_processed_job_queues_a_post_sync(self):
+        self.update_feed("processed").assert_called_once_with(self.feed.id)
+        self.feed.refresh_from_db()
+        self.assertIsNone(self.feed.active_job_id)
+
+    @override_settings(OBSTRACT_LOCAL_POSTS=True)
+    def test_running_job_does_not_sync(self):
+        self.update_feed("processing").assert_not_called()
+
+    @override_settings(OBSTRACT_LOCAL_POSTS=False)
+    def test_local_posts_disabled(self):
+        self.update_feed("processed").assert_not_called()
+
+
+def get_upstream_response(content=b'{"posts": []}', status_code=200, headers=None):
+    """
+    Stands in for the streamed requests.Response of the Obstracts service.
+    """
+    headers = CaseInsensitiveDict({"Content-Type": "application/json", **(headers or {})})
+    upstream_response = mock.Mock(status_code=status_code, headers=headers)
+
+    def stream(chunk_size, decode_content=False):
+        body = content
+        if decode_content and headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return iter([body[i: i + chunk_size] for i in range(0, len(body), chunk_size)])
+
+    upstream_response.raw.stream.side_effect = stream
+    return upstream_response
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    OBSTRACT_PROXY_COALESCE="local",
+    OBSTRACT_PROXY_CHUNK_SIZE=4,
+)
+class ProxyViewTestCase(SimpleTestCase):
+    view_class = ProxyView
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser(username="admin@example.com", is_staff=True)
+
+    def get(self, path="/proxy/feeds/", view_class=None, **headers):
+        request = APIRequestFactory().get(path, **headers)
+        force_authenticate(request, user=self.user)
+        return (view_class or self.view_class).as_view()(request, path=path.removeprefix("/proxy/"))
+
+    def patch_upstream(self, *upstream_responses, **kwargs):
+        if upstream_responses:
+            kwargs["side_effect"] = list(upstream_responses)
+        return mock.patch("apps.obstracts_api.client.request", **kwargs)
+
+
+class ProxyStreamingTest(ProxyViewTestCase):
+    @override_settings(OBSTRACT_PROXY_STREAMING=True)
+    def test_body_is_streamed(self):
+        with self.patch_upstream(get_upstream_response(b'{"posts": [1, 2]}')) as request:
+            response = self.get("/proxy/feeds/?page=2")
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content), b'{"posts": [1, 2]}')
+        self.assertTrue(request.call_args.kwargs["stream"])
+        self.assertEqual(request.call_args.kwargs["params"], [("page", "2")])
+
+    @override_settings(OBSTRACT_PROXY_STREAMING=False)
+    def test_body_is_buffered_when_streaming_is_off(self):
+        with self.patch_upstream(get_upstream_response(b'{"posts": [1, 2]}')):
+            response = self.get()
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content, b'{"posts": [1, 2]}')
+
+
+@override_settings(OBSTRACT_PROXY_STREAMING=False)
+class ProxyHeadersTest(ProxyViewTestCase):
+    def test_hop_by_hop_headers_are_stripped(self):
+        upstream_response = get_upstream_response(
+            headers={"ETag": '"v1"', "Connection": "close", "Transfer-Encoding": "chunked", "Set-Cookie": "a=b"}
+        )
+        with self.patch_upstream(upstream_response) as request:
+            response = self.get(
+                HTTP_CONNECTION="keep-alive", HTTP_TE="trailers", HTTP_X_TRACE="1", HTTP_ACCEPT_ENCODING="br"
+            )
+        headers = {key.lower(): value for key, value in request.call_args.kwargs["headers"].items()}
+        self.assertEqual(headers["x-trace"], "1")
+        self.assertEqual(headers["accept-encoding"], "gzip")
+        for header in ("connection", "te", "host"):
+            self.assertNotIn(header, headers)
+        self.assertEqual(response["ETag"], '"v1"')
+        for header in ("Connection", "Transfer-Encoding", "Set-Cookie"):
+            self.assertFalse(response.has_header(header))
+
+    def test_upstream_status_is_forwarded(self):
+        with self.patch_upstream(get_upstream_response(b'{"detail": "missing"}', status_code=404)):
+            response = self.get()
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.content, b'{"detail": "missing"}')
+
+    def test_upstream_errors(self):
+        for error, status_code in [
+            (requests.Timeout(), 504),
+            (requests.ConnectionError(), 502),
+            (CircuitOpen(wait=10), 503),
+        ]:
+            with self.subTest(error=error), self.patch_upstream(side_effect=error):
+                self.assertEqual(self.get().status_code, status_code)
+
+    def test_circuit_open_sets_retry_after(self):
+        with self.patch_upstream(side_effect=CircuitOpen(wait=10)):
+            response = self.get()
+        self.assertEqual(response["Retry-After"], "10")
+
+
+class CachedProxyView(ProxyView):
+    cache_route = "feeds"
+
+
+@override_settings(OBSTRACT_PROXY_CACHE_TTLS={"feeds": 60}, OBSTRACT_PROXY_STREAMING=False)
+class ProxyCacheTest(ProxyViewTestCase):
+    view_class = CachedProxyView
+
+    def test_miss_hit_and_not_modified(self):
+        with self.patch_upstream(get_upstream_response(b'{"posts": []}', headers={"ETag": '"v1"'})) as request:
+            miss = self.get()
+            hit = self.get()
+            not_modified = self.get(HTTP_IF_NONE_MATCH='W/"v1"')
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual((miss["X-Cache"], miss.content), ("MISS", b'{"posts": []}'))
+        self.assertEqual((hit["X-Cache"], hit.content), ("HIT", b'{"posts": []}'))
+        self.assertEqual((not_modified.status_code, not_modified["ETag"]), (304, '"v1"'))
+
+    def test_expired_entry_is_revalidated(self):
+        with self.patch_upstream(
+            get_upstream_response(headers={"ETag": '"v1"'}),
+            get_upstream_response(b"", status_code=304),
+        ) as request:
+            self.get()
+            with mock.patch("apps.obstracts_api.cache.time.time", return_value=time.time() + 90):
+                response = self.get()
+        self.assertEqual(request.call_args.kwargs["headers"]["If-None-Match"], '"v1"')
+        self.assertEqual((response.status_code, response["X-Cache"]), (200, "REVALIDATED"))
+        self.assertEqual(response.content, b'{"posts": []}')
+
+    def test_uncacheable_responses_are_not_stored(self):
+        with self.patch_upstream(
+            get_upstream_response(headers={"Cache-Control": "no-store"}),
+            get_upstream_response(status_code=500),
+            get_upstream_response(),
+        ) as request:
+            statuses = [self.get()["X-Cache"] for _ in range(3)]
+        self.assertEqual(statuses, ["BYPASS", "BYPASS", "MISS"])
+        self.assertEqual(request.call_count, 3)
+
+
+class AsyncCachedProxyView(AsyncProxyMixin, CachedProxyView):
+    pass
+
+
+def get_async_upstream_response(content=b'{"posts": []}', status_code=200, headers=None):
+    # a ByteStream is not read on creation, so the raw body can still be iterated like a network response
+    return httpx.Response(
+        status_code,
+        headers={"Content-Type": "application/json", **(headers or {})},
+        stream=httpx.ByteStream(content),
+    )
+
+
+@override_settings(OBSTRACT_PROXY_CACHE_TTLS={"feeds": 60}, OBSTRACT_PROXY_STREAMING=False)
+class AsyncProxyViewTest(ProxyViewTestCase):
+    view_class = AsyncProxyView
+
+    def aget(self, view_class=None, read=None, **headers):
+        async def run():
+            response = await self.get(view_class=view_class, **headers)
+            if read:
+                return response, b"".join([chunk async for chunk in response.streaming_content])
+            return response
+
+        return asyncio.run(run())
+
+    def patch_async_upstream(self, *upstream_responses, **kwargs):
+        if upstream_responses:
+            kwargs["side_effect"] = list(upstream_responses)
+        return mock.patch("apps.obstracts_api.client.async_send", new_callable=mock.AsyncMock, **kwargs)
+
+    def test_views_are_async(self):
+        self.assertTrue(AsyncProxyView.view_is_async)
+        self.assertTrue(iscoroutinefunction(AsyncProxyView.as_view()))
+
+    def test_upstream_call_goes_through_httpx(self):
+        with self.patch_upstream() as request:
+            with self.patch_async_upstream(get_async_upstream_response(b'{"posts": [1]}')) as async_send:
+                response = self.aget()
+        self.assertEqual((response.status_code, response.content), (200, b'{"posts": [1]}'))
+        async_send.assert_awaited_once()
+        request.assert_not_called()
+
+    @override_settings(OBSTRACT_PROXY_STREAMING=True)
+    def test_body_is_streamed(self):
+        with self.patch_async_upstream(get_async_upstream_response(b'{"posts": [1, 2]}')):
+            response, content = self.aget(read=True)
+        self.assertTrue(response.streaming)
+        self.assertEqual(content, b'{"posts": [1, 2]}')
+
+    def test_cache(self):
+        with self.patch_async_upstream(get_async_upstream_response()) as async_send:
+            statuses = [self.aget(view_class=AsyncCachedProxyView)["X-Cache"] for _ in range(2)]
+        self.assertEqual(statuses, ["MISS", "HIT"])
+        async_send.assert_awaited_once()
+
+    def test_upstream_errors(self):
+        for error, status_code in [(httpx.ReadTimeout("timeout"), 504), (httpx.ConnectError("refused"), 502)]:
+            with self.subTest(error=error), self.patch_async_upstream(side_effect=error):
+                self.assertEqual(self.aget().status_code, status_code)
+
+
+@override_settings(
+    OBSTRACT_PROXY_CACHE_TTLS={"open_feeds": 60}, OBSTRACT_PROXY_STALE_TTL=300, OBSTRACT_PROXY_STREAMING=False
+)
+class StaleWhileRevalidateTest(ProxyViewTestCase):
+    view_class = OpenFeedProxyView
+    path = f"/proxy/open/feeds/{uuid.UUID(int=1)}/posts/"
+
+    def test_stale_entry_is_served_and_refreshed_in_the_background(self):
+        with self.patch_upstream(get_upstream_response(b'{"posts": [1]}', headers={"ETag": '"v1"'})) as request:
+            self.get(self.path)
+            with mock.patch("apps.obstracts_api.cache.time.time", return_value=time.time() + 90):
+                with mock.patch("apps.obstracts_api.tasks.refresh_proxy_response.delay") as delay:
+                    responses = [self.get(self.path) for _ in range(2)]
+                self.assertEqual([(r["X-Cache"], r.content) for r in responses], [("STALE", b'{"posts": [1]}')] * 2)
+                self.assertEqual(request.call_count, 1)
+                # queued once, the refresh lock is held until the task ran
+                delay.assert_called_once()
+                cache_key, target_url, params, headers, cache_timeout, endpoint = delay.call_args.args
+                self.assertTrue(target_url.endswith(f"/feeds/{uuid.UUID(int=1)}/posts/"))
+                self.assertEqual((cache_timeout, endpoint), (60, "feeds"))
+
+                refreshed = get_upstream_response(b'{"posts": [1, 2]}', headers={"ETag": '"v2"'})
+                with mock.patch("apps.obstracts_api.client.get", return_value=refreshed):
+                    tasks.refresh_proxy_response(*delay.call_args.args)
+                response = self.get(self.path)
+        self.assertEqual((response["X-Cache"], response.content), ("HIT", b'{"posts": [1, 2]}'))
+
+    def test_entries_past_the_stale_ttl_are_fetched(self):
+        with self.patch_upstream(get_upstream_response(), get_upstream_response()) as request:
+            self.get(self.path)
+            with mock.patch("apps.obstracts_api.cache.time.time", return_value=time.time() + 400):
+                with mock.patch("apps.obstracts_api.tasks.refresh_proxy_response.delay") as delay:
+                    response = self.get(self.path)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(request.call_count, 2)
+        delay.assert_not_called()
+
+
+@override_settings(OBSTRACT_PROXY_CACHE_TTLS={"feeds": 60}, OBSTRACT_PROXY_STREAMING=False)
+class ContentEncodingPassthroughTest(ProxyViewTestCase):
+    body = b'{"posts": []}'
+
+    def get_gzip_response(self):
+        return get_upstream_response(gzip.compress(self.body), headers={"Content-Encoding": "gzip"})
+
+    def test_compressed_body_is_passed_through(self):
+        upstream_response = self.get_gzip_response()
+        with self.patch_upstream(upstream_response):
+            response = self.get(HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response.content, gzip.compress(self.body))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertFalse(upstream_response.raw.stream.call_args.kwargs["decode_content"])
+
+    def test_body_is_decoded_for_clients_without_the_encoding(self):
+        with self.patch_upstream(self.get_gzip_response()):
+            response = self.get(HTTP_ACCEPT_ENCODING="br")
+        self.assertEqual(response.content, self.body)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_cached_body_is_kept_compressed(self):
+        with self.patch_upstream(self.get_gzip_response()) as request:
+            compressed = self.get(view_class=CachedProxyView, HTTP_ACCEPT_ENCODING="gzip")
+            decoded = self.get(view_class=CachedProxyView)
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual((compressed["X-Cache"], compressed.content), ("MISS", gzip.compress(self.body)))
+        self.assertEqual((decoded["X-Cache"], decoded.content), ("HIT", self.body))
+        self.assertFalse(decoded.has_header("Content-Encoding"))
+
+
+class PostsByExtractionViewTest(TestCase):
+    def setUp(self):
+        self.team = Team.objects.create(name="Team", slug="team")
+        self.subscribed = Feed.objects.create(obstract_feed_metadata={}, job_metadata={}, is_public=True)
+        self.public = Feed.objects.create(obstract_feed_metadata={}, job_metadata={}, is_public=True)
+        self.private = Feed.objects.create(obstract_feed_metadata={}, job_metadata={})
+        FeedSubsription.objects.create(team=self.team, feed=self.subscribed)
+        self.user = CustomUser.objects.create(username="user@example.com", email="user@example.com")
+        self.post_ids = [(str(feed.id), str(uuid.uuid4())) for feed in (self.subscribed, self.public, self.private)]
+
+    def get(self, team_id=None, **params):
+        request = APIRequestFactory().get("/", params)
+        force_authenticate(request, user=self.user)
+        kwargs = {"object_id": "indicator--1"}
+        if team_id:
+            kwargs["team_id"] = team_id
+        with (
+            mock.patch("apps.obstracts_api.views.get_object_reports", return_value={"page_number": 1, "reports": []}),
+            mock.patch("apps.obstracts_api.views.get_reports_post_ids", return_value=self.post_ids),
+            mock.patch(
+                "apps.obstracts_api.views.get_posts",
+                side_effect=lambda pairs: [{"id": post_id, "feed_id": feed_id} for feed_id, post_id in pairs],
+            ) as get_posts,
+        ):
+            response = PostsByExtractionView.as_view()(request, **kwargs)
+        return response, get_posts
+
+    def assertFetched(self, get_posts, feeds):
+        expected = [pair for pair in self.post_ids if pair[0] in {str(feed.id) for feed in feeds}]
+        get_posts.assert_called_once_with(expected)
+
+    def test_team_sees_public_feeds(self):
+        response, get_posts = self.get(self.team.id)
+        self.assertFetched(get_posts, [self.subscribed, self.public])
+        self.assertEqual(
+            {post["feed_id"]: post["feed"]["is_subscribed"] for post in response.data["posts"]},
+            {str(self.subscribed.id): True, str(self.public.id): False},
+        )
+
+    def test_team_only_subscribed_feeds(self):
+        _, get_posts = self.get(self.team.id, show_only_my_feeds="true")
+        self.assertFetched(get_posts, [self.subscribed])
+
+    def test_staff_sees_every_feed(self):
+        self.user.is_staff = True
+        _, get_posts = self.get()
+        self.assertFetched(get_posts, [self.subscribed, self.public, self.private])
+
+    def test_all_feeds_need_staff(self):
+        response, get_posts = self.get()
+        self.assertEqual(response.status_code, 403)
+        get_posts.assert_not_called()
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework import routers
 from drf_spectacular.views import SpectacularSwaggerView
@@ -15,8 +16,31 @@ from .views import (
     LatestPostView,
     ObjectProxyView,
     ObjectsProxyView,
+    AsyncProxyView,
+    AsyncFeedProxyView,
+    AsyncTeamFeedProxyView,
+    AsyncOpenFeedProxyView,
+    AsyncObjectProxyView,
+    AsyncObjectsProxyView,
+    UpstreamMetricsView,
 )
 
+# served instead of the sync views when OBSTRACT_PROXY_ASYNC is set
+ASYNC_PROXY_VIEWS = {
+    ProxyView: AsyncProxyView,
+    FeedProxyView: AsyncFeedProxyView,
+    TeamFeedProxyView: AsyncTeamFeedProxyView,
+    OpenFeedProxyView: AsyncOpenFeedProxyView,
+    ObjectProxyView: AsyncObjectProxyView,
+    ObjectsProxyView: AsyncObjectsProxyView,
+}
+
+
+def proxy_view(view_class):
+    if settings.OBSTRACT_PROXY_ASYNC:
+        view_class = ASYNC_PROXY_VIEWS[view_class]
+    return view_class.as_view()
+
 
 router = routers.DefaultRouter()
 router.register("feeds", FeedViewSet, basename='feeds')
@@ -30,18 +54,19 @@ api_router.register('', TeamTokenFeedViewSet, basename='team-token-feeds')
 
 urlpatterns = router.urls + [
     path("team/<str:team_id>/", include(team_router.urls), name="team_feeds"),
-    path("proxy/open/feeds/<uuid:feed_id>/posts/", OpenFeedProxyView.as_view(), name=""),
-    path("proxy/open/feeds/<uuid:feed_id>/posts/<uuid:post_id>/", OpenFeedProxyView.as_view(), name=""),
-    path("proxy/open/feeds/<uuid:feed_id>/posts/<uuid:post_id>/markdown/", OpenFeedProxyView.as_view(), name=""),
-    path("proxy/open/objects/scos/", OpenFeedProxyView.as_view(), name=""),
-    path("proxy/open/object/<str:object_id>/reports/", OpenFeedProxyView.as_view(), name=""),
-    path("proxy/teams/<str:team_id>/feeds/<str:feed_id>/<path:path>", TeamFeedProxyView.as_view(), name="proxy"),
-    path("proxy/<path:path>", ProxyView.as_view(), name="proxy"),
-    path("api/v1/feeds/<uuid:feed_id>/<path:path>", FeedProxyView.as_view(), name="proxy"),
-    path("api/v1/objects/<path:path>", ObjectsProxyView.as_view(), name="objects-proxy"),
-    path("api/v1/object/<str:object_id>", ObjectProxyView.as_view(), name="objects-proxy"),
+    path("proxy/open/feeds/<uuid:feed_id>/posts/", proxy_view(OpenFeedProxyView), name=""),
+    path("proxy/open/feeds/<uuid:feed_id>/posts/<uuid:post_id>/", proxy_view(OpenFeedProxyView), name=""),
+    path("proxy/open/feeds/<uuid:feed_id>/posts/<uuid:post_id>/markdown/", proxy_view(OpenFeedProxyView), name=""),
+    path("proxy/open/objects/scos/", proxy_view(OpenFeedProxyView), name=""),
+    path("proxy/open/object/<str:object_id>/reports/", proxy_view(OpenFeedProxyView), name=""),
+    path("proxy/teams/<str:team_id>/feeds/<str:feed_id>/<path:path>", proxy_view(TeamFeedProxyView), name="proxy"),
+    path("proxy/<path:path>", proxy_view(ProxyView), name="proxy"),
+    path("api/v1/feeds/<uuid:feed_id>/<path:path>", proxy_view(FeedProxyView), name="proxy"),
+    path("api/v1/objects/<path:path>", proxy_view(ObjectsProxyView), name="objects-proxy"),
+    path("api/v1/object/<str:object_id>", proxy_view(ObjectProxyView), name="objects-proxy"),
     path("api/v1/feeds/", include(api_router.urls), name="team-feeds"),
     path('api/schema/schema-json', SchemaView.as_view(), name='schema-json'),
+    path("metrics/upstream/", UpstreamMetricsView.as_view(), name="upstream-metrics"),
     path(
         "api/schema/swagger-ui/",
         SpectacularSwaggerView.as_view(url="../schema-json"),
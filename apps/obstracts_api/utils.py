@@ -1,13 +1,26 @@
-import requests
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+
 from rest_framework.exceptions import ValidationError
 from django.conf import settings
+from . import client
+from .cache import (
+    get_cached_latest_posts,
+    get_cached_posts,
+    get_feed_set_hash,
+    save_cached_latest_posts,
+    save_cached_posts,
+)
 
 OBSTRACT_SERVICE_API = settings.OBSTRACT_SERVICE_API
 
+logger = logging.getLogger("obstracts_web.obstracts_api")
+
 
 def get_obstracts_job(feed_id, job_id):
-    response = requests.get(
+    response = client.get(
         OBSTRACT_SERVICE_API + f"/feeds/{feed_id}/jobs/{job_id}/",
+        endpoint="jobs",
     )
     response.raise_for_status()
     return response.json()
@@ -29,9 +42,10 @@ def create_obstracts_feed(
         "description": description,
         "title": title,
     }
-    response = requests.post(
+    response = client.post(
         OBSTRACT_SERVICE_API + "/feeds/",
         json=data,
+        endpoint="feeds",
     )
     if (response.status_code == 400):
         raise ValidationError(response.json())
@@ -51,9 +65,10 @@ def create_obstracts_skeleton_feed(
         "description": description,
         "title": title,
     }
-    response = requests.post(
+    response = client.post(
         OBSTRACT_SERVICE_API + "/feeds/skeleton/",
         json=data,
+        endpoint="feeds",
     )
     if (response.status_code == 400):
         raise ValidationError(response.json())
@@ -62,70 +77,134 @@ def create_obstracts_skeleton_feed(
 
 
 def delete_obstracts_feed(feed_id):
-    return requests.delete(f"{OBSTRACT_SERVICE_API}/feeds/{feed_id}/")
+    return client.delete(f"{OBSTRACT_SERVICE_API}/feeds/{feed_id}/", endpoint="feeds")
 
 
 def get_obstracts_feed(feed_id):
     url = f"{OBSTRACT_SERVICE_API}/feeds/{feed_id}/"
     print(url)
-    return requests.get(url).json()
+    return client.get(url, endpoint="feeds").json()
 
 
 def init_reload_feed(profile_id, feed_id):
     data = {
         "profile_id": str(profile_id),
     }
-    response = requests.patch(
+    response = client.patch(
         OBSTRACT_SERVICE_API + f"/feeds/{feed_id}/fetch/",
         json=data,
+        endpoint="feeds",
     )
     response.raise_for_status
     return response.json()
 
 def update_feed(feed_id, data):
-    response = requests.patch(
+    response = client.patch(
         OBSTRACT_SERVICE_API + f"/feeds/{feed_id}/",
         json=data,
+        endpoint="feeds",
     )
     response.raise_for_status()
     return response.json()
 
 
-def get_post_for_report_object(object):
-    external_references = object['external_references']
+def get_report_post_ids(report_object):
+    """
+    (feed id, post id) of the post a report was extracted from, None when the report does not reference one.
+    """
+    external_references = report_object['external_references']
     obstracts_feed = next(filter(lambda external_reference: external_reference['source_name'] == 'obstracts_feed_id', external_references), None)
     txt2stix_report = next(filter(lambda external_reference: external_reference['source_name'] == 'txt2stix_report_id', external_references), None)
     if not obstracts_feed or not txt2stix_report:
-        return {}
-    feed_id = obstracts_feed['external_id']
-    post_id = txt2stix_report['external_id']
-    response = requests.get(
+        return None
+    return obstracts_feed['external_id'], txt2stix_report['external_id']
+
+
+def get_post(feed_id, post_id):
+    response = client.get(
         OBSTRACT_SERVICE_API + f"/feeds/{feed_id}/posts/{post_id}/",
+        endpoint="posts",
     )
     response.raise_for_status()
     post = response.json()
     post['feed_id'] = feed_id
-    return post, feed_id
+    return post
+
+
+def get_posts(post_ids):
+    """
+    Fetches the posts of a list of (feed id, post id), in the order given.
+
+    Posts are read from the post cache first, the missing ones are fetched concurrently with at most
+    OBSTRACT_SERVICE_FANOUT_WORKERS requests at once. Posts that failed or were not fetched within
+    OBSTRACT_SERVICE_FANOUT_TIMEOUT seconds are left out.
+    """
+    if not post_ids:
+        return []
+    posts = get_cached_posts(post_ids)
+    missing = list(dict.fromkeys(ids for ids in post_ids if ids not in posts))
+    if missing:
+        fetched = _fetch_posts(missing)
+        save_cached_posts(fetched)
+        posts.update(fetched)
+    return [posts[ids] for ids in post_ids if ids in posts]
+
+
+def _fetch_posts(post_ids):
+    executor = ThreadPoolExecutor(max_workers=min(len(post_ids), settings.OBSTRACT_SERVICE_FANOUT_WORKERS))
+    futures = [executor.submit(get_post, feed_id, post_id) for feed_id, post_id in post_ids]
+    try:
+        wait(futures, timeout=settings.OBSTRACT_SERVICE_FANOUT_TIMEOUT)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    posts = {}
+    for (feed_id, post_id), future in zip(post_ids, futures):
+        if not future.done() or future.cancelled():
+            logger.warning(f"Timed out fetching post {post_id} of feed {feed_id}")
+            continue
+        if future.exception():
+            logger.warning(f"Could not fetch post {post_id} of feed {feed_id}: {future.exception()}")
+            continue
+        posts[(feed_id, post_id)] = future.result()
+    return posts
+
+
+def get_object_reports(object_id, page):
+    response = client.get(
+        OBSTRACT_SERVICE_API + f"/object/{object_id}/reports/",
+        params={"page": page},
+        endpoint="reports"
+    )
+    response.raise_for_status()
+    return response.json()
 
 
-def get_posts_by_extractions(object_id, page):
-    response = requests.get(
-        OBSTRACT_SERVICE_API + f"/object/{object_id}/reports/",
-        params={"page": page}
+def get_reports_post_ids(report_objects):
+    return [
+        post_ids
+        for post_ids in map(get_report_post_ids, report_objects)
+        if post_ids
+    ]
+
+
+def get_feed_posts(feed_id, page, page_size, sort=None):
+    response = client.get(
+        OBSTRACT_SERVICE_API + f"/feeds/{feed_id}/posts/",
+        params={"page": page, "page_size": page_size, "sort": sort},
+        endpoint="posts",
     )
     response.raise_for_status()
-    report_objects = response.json()["reports"]
-    posts = []
-    feed_id_dict = {}
-    for report_object in report_objects:
-        post, feed_id = get_post_for_report_object(report_object)
-        post_id = post.get('id')
-        feed_id_dict[feed_id] = True
-        posts.append(post)
-    return posts, feed_id_dict.keys(), response.json()
+    return response.json()
 
 
 def get_latest_posts(feed_ids, sort, title, page):
+    """
+    Latest posts of `feed_ids` (all feeds when None) from the Obstracts /posts/ endpoint.
+
+    Responses are cached for OBSTRACT_LATEST_POSTS_CACHE_TTL seconds under the hash of the feed set,
+    so teams following the same feeds share entries. The ids are sent sorted for the same reason.
+    """
     if feed_ids == []:
         return {
             "page_size": 10,
@@ -134,17 +213,26 @@ def get_latest_posts(feed_ids, sort, title, page):
             "total_results_count": 0,
             "posts": [],
         }
-    
-    response = requests.get(
+
+    if feed_ids is not None:
+        feed_ids = sorted({str(feed_id) for feed_id in feed_ids})
+    feed_set_hash = get_feed_set_hash(feed_ids or ["*"])
+    params = {
+        "page": page,
+        "page_size": 10,
+        "title": title,
+        "sort": sort,
+    }
+    response_data = get_cached_latest_posts(feed_set_hash, params)
+    if response_data is not None:
+        return response_data
+
+    response = client.get(
         OBSTRACT_SERVICE_API + f"/posts/",
-        params={
-            "feed_id": feed_ids,
-            "page": page,
-            "page_size": 10,
-            "title": title,
-            "sort": sort,
-        }
+        params={"feed_id": feed_ids, **params},
+        endpoint="posts"
     )
     response.raise_for_status()
     response_data = response.json()
+    save_cached_latest_posts(feed_set_hash, params, response_data)
     return response_data
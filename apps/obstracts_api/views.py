@@ -1,18 +1,12 @@
-import requests
 from django.conf import settings
 from django.db.models import Exists, OuterRef, Value, BooleanField
-from django.db.models.functions import Cast
-from django.db.models.fields.json import KT as KeyTextTransform
-from django.db.models import CharField, IntegerField, DateTimeField
-from django.http import JsonResponse, HttpResponse
-from django.views import View
+from django.http import JsonResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
 from rest_framework import filters, response, status
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
 from rest_framework.decorators import action
 from rest_framework.exceptions import (
-    MethodNotAllowed,
     NotFound,
     ValidationError as DRFValidationError,
     PermissionDenied,
@@ -25,15 +19,19 @@ from rest_framework.mixins import (
     RetrieveModelMixin,
     UpdateModelMixin,
 )
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 from apps.api.permissions import HasTeamApiKey, HasTeamFeedApiKey
-from apps.teams.models import Membership, Team
-from .models import Feed, FeedSubsription
-from .pagination import CustomPagination
+from apps.api.throttling import RateLimitHeadersMixin, TeamRateThrottle
+from .access import get_team_feed_access
+from .breaker import get_local_snapshots, get_published_snapshots
+from .exceptions import FeedNotSubscribed, NotTeamMember, SubscriptionRequired, TeamNotFound
+from .models import METADATA_FIELDS, METADATA_SORT_EXPRESSIONS, Feed, FeedSubsription
+from .pagination import KeysetPagination
+from .post_index import POST_SORTS, get_feed_post_queryset
+from .proxy import AsyncProxyMixin, ObstractsProxyView
 from .serializers import (
     FeedSerializer,
     FeedUpdateSerializer,
@@ -42,55 +40,45 @@ from .serializers import (
     FeedWithSubscriptionSerializer,
     SubscribeFeedSerializer,
 )
-from .utils import delete_obstracts_feed, get_posts_by_extractions, get_latest_posts
-
-
-class ProxyView(APIView):
-    def dispatch(self, request, *args, **kwargs):
-        self.args = args
-        self.kwargs = kwargs
-        request = self.initialize_request(request, *args, **kwargs)
-        self.request = request
-        self.headers = self.default_response_headers  # deprecate?
-        try:
-            if not IsAdminUser().has_permission(self.request, self):
-                raise PermissionDenied()
-            # Modify the target URL as needed
-            target_url = settings.OBSTRACT_SERVICE_API + "/" + kwargs["path"]
-
-            # Forward the request to the target URL
-            response = requests.request(
-                method=request.method,
-                url=target_url,
-                headers={
-                    key: value
-                    for key, value in request.headers.items()
-                    if key != "Host"
-                },
-                data=request.body,
-                params={key: value for key, value in request.GET.items()},
-                allow_redirects=False,
-            )
+from .utils import (
+    delete_obstracts_feed,
+    get_latest_posts,
+    get_object_reports,
+    get_posts,
+    get_reports_post_ids,
+)
 
-            # Return the response to the original request
-            return HttpResponse(
-                response.content,
-                status=response.status_code,
-                content_type=self.headers.get("Content-Type"),
-            )
-        except PermissionDenied:
-            return HttpResponse(
-                {},
-                status=401,
-                content_type=self.headers.get("Content-Type"),
-            )
-        except Exception as exc:
-            response = self.handle_exception(exc)
-            self.response = self.finalize_response(request, response, *args, **kwargs)
-            return self.response
+
+class ProxyView(ObstractsProxyView):
+    permission_classes = [IsAdminUser]
+    proxy_methods = ("GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS")
+
+    def get_target_url(self, request, *args, **kwargs):
+        return settings.OBSTRACT_SERVICE_API + "/" + kwargs["path"]
+
+
+def sort_feed_queryset(queryset, order_by):
+    """
+    Orders feeds by one of the obstract_feed_metadata keys in METADATA_FIELDS, `-` prefixed for
+    descending. The copied columns are indexed, unlike the JSON keys. Titles are sorted on the
+    bounded prefix of their index as a `sort_title` annotation, the other unbounded text columns
+    only have trigram indexes for searching.
+    """
+    if not order_by:
+        return queryset
+    desc = order_by.startswith("-")
+    key = order_by.lstrip("-")
+    field_name = METADATA_FIELDS.get(key)
+    if not field_name:
+        return queryset
+    expression = METADATA_SORT_EXPRESSIONS.get(field_name)
+    if expression is not None:
+        field_name = f"sort_{key}"
+        queryset = queryset.annotate(**{field_name: expression})
+    return queryset.order_by(('-' if desc else '') + field_name)
 
 
-class LargeResultsSetPagination(PageNumberPagination):
+class LargeResultsSetPagination(KeysetPagination):
     page_size = 100
     page_size_query_param = "page_size"
     max_page_size = 10000
@@ -114,44 +102,14 @@ class FeedViewSet(
     permission_classes = [IsAdminUser]
 
     def sort_queryset(self, queryset):
-        order_by = self.request.query_params.get("order_by")
-        order_types = {
-            "url": CharField(),
-            "title": CharField(),
-            "feed_type": CharField(),
-            "pretty_url": CharField(),
-            "description": CharField(),
-            "count_of_posts": IntegerField(),
-            "datetime_added": DateTimeField(),
-            "latest_item_pubdate": DateTimeField(),
-            "earliest_item_pubdate": DateTimeField(),
-        }
-        annotate_field_name = f'sort_{order_by}'
-        if order_by:
-            desc = False
-            if "-" in order_by:
-                desc = True
-                order_by = order_by.replace("-", "")
-            if order_by not in order_types.keys():
-                return queryset
-            queryset = queryset.annotate(
-                **{
-                    annotate_field_name: Cast(
-                        KeyTextTransform(f"obstract_feed_metadata__{order_by}"), order_types[order_by]
-                    )
-                }
-            )
-            order_by_field = ('-' if desc else '') + annotate_field_name
-            queryset = queryset.order_by(order_by_field)
-        return queryset
+        return sort_feed_queryset(queryset, self.request.query_params.get("order_by"))
 
     def filter_queryset(self, queryset):
         title = self.request.query_params.get("title")
         queryset = self.sort_queryset(queryset)
         if title:
-            queryset = queryset.annotate(
-                title_filter=KeyTextTransform("obstract_feed_metadata__title")
-            ).filter(title_filter__icontains=title)
+            # served by the trigram index on metadata_title
+            queryset = queryset.filter(metadata_title__icontains=title)
         return super().filter_queryset(queryset)
 
 
@@ -184,50 +142,21 @@ class FeedViewSet(
 
 class TeamFeedViewSet(GenericViewSet, ListModelMixin, RetrieveModelMixin):
     # pagination_class = PageNumberPagination
-    pagination_class = CustomPagination
+    pagination_class = KeysetPagination
     serializer_class = FeedWithSubscriptionSerializer
     filter_backends = [filters.OrderingFilter, filters.SearchFilter]
+    search_fields = ["metadata_title", "metadata_pretty_url", "metadata_description"]
     # pagination_class = None
 
     def sort_queryset(self, queryset):
-        order_by = self.request.query_params.get("order_by")
-        order_types = {
-            "url": CharField(),
-            "title": CharField(),
-            "feed_type": CharField(),
-            "pretty_url": CharField(),
-            "description": CharField(),
-            "count_of_posts": IntegerField(),
-            "datetime_added": DateTimeField(),
-            "latest_item_pubdate": DateTimeField(),
-            "earliest_item_pubdate": DateTimeField(),
-        }
-        annotate_field_name = f'sort_{order_by}'
-        if order_by:
-            desc = False
-            if "-" in order_by:
-                desc = True
-                order_by = order_by.replace("-", "")
-            if order_by not in order_types.keys():
-                return queryset
-            queryset = queryset.annotate(
-                **{
-                    annotate_field_name: Cast(
-                        KeyTextTransform(f"obstract_feed_metadata__{order_by}"), order_types[order_by]
-                    )
-                }
-            )
-            order_by_field = ('-' if desc else '') + annotate_field_name
-            queryset = queryset.order_by(order_by_field)
-        return queryset
+        return sort_feed_queryset(queryset, self.request.query_params.get("order_by"))
 
     def filter_queryset(self, queryset):
         title = self.request.query_params.get("title")
         queryset = self.sort_queryset(queryset)
         if title:
-            queryset = queryset.annotate(
-                title_filter=KeyTextTransform("obstract_feed_metadata__title")
-            ).filter(title_filter__icontains=title)
+            # served by the trigram index on metadata_title
+            queryset = queryset.filter(metadata_title__icontains=title)
         return super().filter_queryset(queryset)
 
     def get_feeds_with_subscription_status(self, team_id):
@@ -254,7 +183,8 @@ class TeamFeedViewSet(GenericViewSet, ListModelMixin, RetrieveModelMixin):
         team = self.request.team
         if team.is_private:
             raise DRFValidationError("Team has no access to this API")
-        if not team.active_stripe_subscription:
+        entitlements = team.entitlements
+        if not entitlements.has_active_subscription:
             raise DRFValidationError(
                 {
                     "code": "E01",
@@ -262,7 +192,7 @@ class TeamFeedViewSet(GenericViewSet, ListModelMixin, RetrieveModelMixin):
                 }
             )
         team_suscription_count = FeedSubsription.objects.filter(team=team).count()
-        team_feed_suscription_limit = team.get_feed_limit()
+        team_feed_suscription_limit = entitlements.feed_limit
         if (
             team_feed_suscription_limit
             and not team_feed_suscription_limit > team_suscription_count
@@ -308,9 +238,13 @@ class TeamFeedViewSet(GenericViewSet, ListModelMixin, RetrieveModelMixin):
     #     return Response(serializer.data)
 
 
+class LatestPostPagination(KeysetPagination):
+    page_size = 10
+
+
 class LatestPostView(ListAPIView):
     permission_classes = [IsAuthenticated]
-    
+
     def list(self, *args, **kwargs):
         team_id = kwargs.get("team_id")
         page = self.request.query_params.get("page")
@@ -326,8 +260,11 @@ class LatestPostView(ListAPIView):
         else:
             if not self.request.user.is_staff:
                 raise PermissionDenied()
-        response = get_latest_posts(feed_ids, sort, title, page)
-        posts = response['posts']
+        if settings.OBSTRACT_LOCAL_POSTS:
+            data = self.get_local_posts(feed_ids, sort, title)
+        else:
+            data = get_latest_posts(feed_ids, sort, title, page)
+        posts = data['posts']
         if feed_ids == None:
             post_feed_ids = [post['feed_id'] for post in posts]
             feeds = Feed.objects.filter(id__in=post_feed_ids)
@@ -335,7 +272,28 @@ class LatestPostView(ListAPIView):
                 feed_title_dict[str(feed.id)] = feed.obstract_feed_metadata.get('title')
         for post in posts:
             post['feed_title'] = feed_title_dict.get(post['feed_id'])
-        return Response(response)
+        return Response(data)
+
+    def get_local_posts(self, feed_ids, sort, title):
+        """
+        The latest posts from the FeedPost index, in the shape of the Obstracts /posts/ endpoint.
+        `?cursor=` pages by keyset, without the total count.
+        """
+        if sort not in POST_SORTS:
+            raise DRFValidationError({"sort": f"Must be one of {', '.join(POST_SORTS)}"})
+        paginator = LatestPostPagination()
+        page = paginator.paginate_queryset(get_feed_post_queryset(feed_ids, sort, title), self.request, view=self)
+        posts = [post.metadata for post in page]
+        data = {
+            "page_size": paginator.page_size,
+            "page_results_count": len(posts),
+            "next": paginator.get_next_link(),
+            "posts": posts,
+        }
+        if paginator.mode == "page":
+            data["page_number"] = paginator.page.number
+            data["total_results_count"] = paginator.page.paginator.count
+        return data
 
 
 class PostsByExtractionView(ListAPIView):
@@ -360,8 +318,9 @@ class PostsByExtractionView(ListAPIView):
         team_id = kwargs.get("team_id")
         object_id = kwargs.get("object_id")
         page = self.request.query_params.get("page")
-        posts, feed_ids, obstracts_api_response = get_posts_by_extractions(object_id, page)
-        feeds = []
+        obstracts_api_response = get_object_reports(object_id, page)
+        post_ids = get_reports_post_ids(obstracts_api_response["reports"])
+        feed_ids = {feed_id for feed_id, _ in post_ids}
         if team_id:
             feeds = self.get_feeds_with_subscription_status(team_id).filter(
                 id__in=feed_ids
@@ -375,265 +334,126 @@ class PostsByExtractionView(ListAPIView):
         feed_dict = {}
         for feed in feeds:
             feed_dict[str(feed.id)] = FeedWithSubscriptionSerializer(feed).data
-        result = []
 
+        # only posts of feeds the caller may see are fetched
+        posts = get_posts([
+            (feed_id, post_id) for feed_id, post_id in post_ids if feed_id in feed_dict
+        ])
         for post in posts:
-            feed = feed_dict.get(post["feed_id"])
-            if not feed:
-                continue
-            post["feed"] = feed
-            result.append(post)
+            post["feed"] = feed_dict[post["feed_id"]]
         del obstracts_api_response['reports']
         obstracts_api_response['posts'] = posts
         return Response(obstracts_api_response)
 
 
-class FeedProxyView(View):
-    def dispatch(self, request, *args, **kwargs):
-        try:
-            if not HasTeamFeedApiKey().has_permission(self.request, self):
-                raise PermissionDenied()
-            # Modify the target URL as needed
-            feed_id = self.feed_id
-            target_url = (
-                f"{settings.OBSTRACT_SERVICE_API}/feeds/{feed_id}/{kwargs['path']}"
-            )
-            if request.method != "GET":
-                raise MethodNotAllowed()
-
-            # Forward the request to the target URL
-            response = requests.request(
-                method="GET",
-                url=target_url,
-                headers={
-                    key: value
-                    for key, value in request.headers.items()
-                    if key != "Host"
-                },
-                data=request.body,
-                params={key: value for key, value in request.GET.items()},
-                allow_redirects=False,
-            )
+class FeedProxyView(RateLimitHeadersMixin, ObstractsProxyView):
+    authentication_classes = []
+    permission_classes = [HasTeamFeedApiKey]
+    throttle_classes = [TeamRateThrottle]
+    cache_route = "feeds"
+    upstream_endpoint = "feeds"
 
-            # Return the response to the original request
-            return HttpResponse(
-                response.content,
-                status=response.status_code,
-                content_type=response.headers.get("Content-Type"),
-            )
-        except PermissionDenied:
-            return HttpResponse(
-                {},
-                status=401,
-            )
-        except Exception as exc:
-            response = self.handle_exception(exc)
-            self.response = self.finalize_response(request, response, *args, **kwargs)
-            return self.response
-
-class ObjectsProxyView(View):
-    def dispatch(self, request, *args, **kwargs):
-        try:
-            if not IsAuthenticated().has_permission(self.request, self):
-                raise PermissionDenied()
-            # Modify the target URL as needed
-            target_url = (
-                f"{settings.OBSTRACT_SERVICE_API}/objects/{kwargs['path']}"
-            )
-            if request.method != "GET":
-                raise MethodNotAllowed()
-
-            # Forward the request to the target URL
-            response = requests.request(
-                method="GET",
-                url=target_url,
-                headers={
-                    key: value
-                    for key, value in request.headers.items()
-                    if key != "Host"
-                },
-                data=request.body,
-                params={key: value for key, value in request.GET.items()},
-                allow_redirects=False,
-            )
+    def get_target_url(self, request, *args, **kwargs):
+        # feed_id is set on the view by HasTeamFeedApiKey
+        return f"{settings.OBSTRACT_SERVICE_API}/feeds/{self.feed_id}/{kwargs['path']}"
 
-            # Return the response to the original request
-            return HttpResponse(
-                response.content,
-                status=response.status_code,
-                content_type=response.headers.get("Content-Type"),
-            )
-        except PermissionDenied:
-            return HttpResponse(
-                {},
-                status=401,
-            )
-        except Exception as exc:
-            response = self.handle_exception(exc)
-            self.response = self.finalize_response(request, response, *args, **kwargs)
-            return self.response
-
-class ObjectProxyView(View):
-    def dispatch(self, request, *args, **kwargs):
-        try:
-            if not IsAuthenticated().has_permission(self.request, self):
-                raise PermissionDenied()
-            # Modify the target URL as needed
-            target_url = (
-                f"{settings.OBSTRACT_SERVICE_API}/object/{kwargs['object_id']}"
-            )
-            if request.method != "GET":
-                raise MethodNotAllowed()
-
-            # Forward the request to the target URL
-            response = requests.request(
-                method="GET",
-                url=target_url,
-                headers={
-                    key: value
-                    for key, value in request.headers.items()
-                    if key != "Host"
-                },
-                data=request.body,
-                params={key: value for key, value in request.GET.items()},
-                allow_redirects=False,
-            )
 
-            # Return the response to the original request
-            return HttpResponse(
-                response.content,
-                status=response.status_code,
-                content_type=response.headers.get("Content-Type"),
-            )
-        except PermissionDenied:
-            return HttpResponse(
-                {},
-                status=401,
-            )
-        except Exception as exc:
-            response = self.handle_exception(exc)
-            self.response = self.finalize_response(request, response, *args, **kwargs)
-            return self.response
-
-
-class TeamFeedProxyView(APIView):
-    def dispatch(self, request, *args, **kwargs):
-        self.args = args
-        self.kwargs = kwargs
-        request = self.initialize_request(request, *args, **kwargs)
-        self.request = request
-        self.headers = self.default_response_headers
-
-        try:
-            if not IsAuthenticated().has_permission(self.request, self):
-                raise PermissionDenied()
+class ObjectsProxyView(RateLimitHeadersMixin, ObstractsProxyView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [TeamRateThrottle]
+    cache_route = "objects"
+    upstream_endpoint = "objects"
 
-            team_id = kwargs.get("team_id")
-            feed_id = kwargs.get("feed_id")
-            team = Team.objects.filter(id=team_id).first()
-            if not team or not team.active_stripe_subscription:
-                raise PermissionDenied("Team has no access to this API")
-            if not Membership.objects.filter(
-                user=self.request.user, team_id=team_id
-            ).exists():
-                raise PermissionDenied()
-            if not FeedSubsription.objects.filter(
-                feed_id=feed_id, team_id=team_id
-            ).exists():
-                raise PermissionDenied()
-            # Modify the target URL as needed
-            target_url = (
-                f"{settings.OBSTRACT_SERVICE_API}/feeds/{feed_id}/{kwargs['path']}"
-            )
-            if request.method != "GET":
-                raise MethodNotAllowed()
-
-            # Forward the request to the target URL
-            response = requests.request(
-                method="GET",
-                url=target_url,
-                headers={
-                    key: value
-                    for key, value in request.headers.items()
-                    if key != "Host"
-                },
-                data=request.body,
-                params={key: value for key, value in request.GET.items()},
-                allow_redirects=False,
-            )
+    def get_target_url(self, request, *args, **kwargs):
+        return f"{settings.OBSTRACT_SERVICE_API}/objects/{kwargs['path']}"
 
-            # Return the response to the original request
-            return HttpResponse(
-                response.content,
-                status=response.status_code,
-                content_type=response.headers.get("Content-Type"),
-            )
-        except PermissionDenied:
-            return HttpResponse(
-                {},
-                status=401,
-            )
-        except Exception as exc:
-            raise exc
-            response = self.handle_exception(exc)
-            self.response = self.finalize_response(request, response, *args, **kwargs)
-            return self.response
-
-
-class OpenFeedProxyView(APIView):
-    def dispatch(self, request, *args, **kwargs):
-        self.args = args
-        self.kwargs = kwargs
-        request = self.initialize_request(request, *args, **kwargs)
-        self.request = request
-        self.headers = self.default_response_headers
-
-        try:
-            if not IsAuthenticated().has_permission(self.request, self):
-                raise PermissionDenied()
 
-            url = request.path
-            path = url.split("proxy/open/")[1]
-            # Modify the target URL as needed
-            target_url = f"{settings.OBSTRACT_SERVICE_API}/{path}"
-            if request.method != "GET":
-                raise MethodNotAllowed()
-
-            # Forward the request to the target URL
-            response = requests.request(
-                method="GET",
-                url=target_url,
-                headers={
-                    key: value
-                    for key, value in request.headers.items()
-                    if key != "Host"
-                },
-                data=request.body,
-                params={key: value for key, value in request.GET.items()},
-                allow_redirects=False,
-            )
+class ObjectProxyView(RateLimitHeadersMixin, ObstractsProxyView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [TeamRateThrottle]
+    cache_route = "object"
+    upstream_endpoint = "objects"
 
-            # Return the response to the original request
-            return HttpResponse(
-                response.content,
-                status=response.status_code,
-                content_type=response.headers.get("Content-Type"),
-            )
-        except PermissionDenied:
-            return HttpResponse(
-                {},
-                status=401,
-            )
-        except Exception as exc:
-            response = self.handle_exception(exc)
-            self.response = self.finalize_response(request, response, *args, **kwargs)
-            return self.response
+    def get_target_url(self, request, *args, **kwargs):
+        return f"{settings.OBSTRACT_SERVICE_API}/object/{kwargs['object_id']}"
+
+
+class TeamFeedProxyView(ObstractsProxyView):
+    permission_classes = [IsAuthenticated]
+    cache_route = "feeds"
+    upstream_endpoint = "feeds"
+
+    def has_proxy_permission(self, request):
+        access = get_team_feed_access(
+            self.kwargs.get("team_id"), request.user, self.kwargs.get("feed_id")
+        )
+        if not access.team_exists:
+            raise TeamNotFound()
+        if not access.is_member:
+            raise NotTeamMember()
+        if not access.has_active_subscription:
+            raise SubscriptionRequired()
+        if not access.is_subscribed:
+            raise FeedNotSubscribed()
+        return True
+
+    def get_target_url(self, request, *args, **kwargs):
+        return f"{settings.OBSTRACT_SERVICE_API}/feeds/{kwargs['feed_id']}/{kwargs['path']}"
+
+
+class OpenFeedProxyView(ObstractsProxyView):
+    permission_classes = [IsAuthenticated]
+    cache_route = "open_feeds"
+    upstream_endpoint = "feeds"
+    stale_while_revalidate = True
+
+    def get_target_url(self, request, *args, **kwargs):
+        path = request.path.split("proxy/open/")[1]
+        return f"{settings.OBSTRACT_SERVICE_API}/{path}"
+
+
+class UpstreamMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(exclude=True)
+    def get(self, request, *args, **kwargs):
+        return Response(
+            {
+                "circuit_breakers": get_published_snapshots(),
+                "current_worker": get_local_snapshots(),
+            }
+        )
+
+
+class AsyncProxyView(AsyncProxyMixin, ProxyView):
+    pass
+
+
+class AsyncFeedProxyView(AsyncProxyMixin, FeedProxyView):
+    pass
+
+
+class AsyncObjectsProxyView(AsyncProxyMixin, ObjectsProxyView):
+    pass
+
+
+class AsyncObjectProxyView(AsyncProxyMixin, ObjectProxyView):
+    pass
+
+
+class AsyncTeamFeedProxyView(AsyncProxyMixin, TeamFeedProxyView):
+    pass
+
+
+class AsyncOpenFeedProxyView(AsyncProxyMixin, OpenFeedProxyView):
+    pass
 
 
-class TeamTokenFeedViewSet(GenericViewSet, ListModelMixin):
-    pagination_class = CustomPagination
+class TeamTokenFeedViewSet(RateLimitHeadersMixin, GenericViewSet, ListModelMixin):
+    pagination_class = KeysetPagination
     serializer_class = SubscribedFeedSerializer
     permission_classes = [HasTeamApiKey]
+    throttle_classes = [TeamRateThrottle]
     lookup_field = "feed_id"
 
     def get_queryset(self):
@@ -0,0 +1,74 @@
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+TEAM_ENTITLEMENTS_CACHE_KEY = 'team.entitlements'
+
+
+@dataclass(frozen=True)
+class TeamEntitlements:
+    """
+    What a team's subscription allows, read from the product metadata of its active subscription.
+    """
+
+    team_id: str
+    has_active_subscription: bool
+    user_limit: int
+    feed_limit: int
+    allowed_api_access: bool
+    allowed_data_download: bool
+    api_rate_limit: int
+
+
+def _get_team_entitlements_cache_key(team_id):
+    return f'{TEAM_ENTITLEMENTS_CACHE_KEY}:{team_id}'
+
+
+def build_team_entitlements(team) -> TeamEntitlements:
+    return TeamEntitlements(
+        team_id=str(team.id),
+        has_active_subscription=team.has_active_subscription,
+        user_limit=team.get_user_limit(),
+        feed_limit=team.get_feed_limit(),
+        allowed_api_access=team.get_allowed_api_access(),
+        allowed_data_download=team.get_allowed_data_download(),
+        api_rate_limit=team.get_api_rate_limit(),
+    )
+
+
+def save_team_entitlements(team) -> TeamEntitlements:
+    entitlements = build_team_entitlements(team)
+    cache.set(
+        _get_team_entitlements_cache_key(team.id),
+        entitlements,
+        timeout=settings.TEAM_ENTITLEMENTS_CACHE_TIMEOUT,
+    )
+    return entitlements
+
+
+def get_cached_team_entitlements(team_id):
+    """
+    Returns the cached snapshot of the team, or None when there is none.
+    """
+    return cache.get(_get_team_entitlements_cache_key(team_id))
+
+
+def get_team_entitlements(team) -> TeamEntitlements:
+    entitlements = get_cached_team_entitlements(team.id)
+    if entitlements is None:
+        entitlements = save_team_entitlements(team)
+    return entitlements
+
+
+def rebuild_team_entitlements(teams):
+    """
+    Rebuilds the snapshots of `teams`, a Team queryset, after their subscription or product changed.
+    """
+    for team in teams.select_related('subscription__plan__product'):
+        save_team_entitlements(team)
+
+
+def invalidate_team_entitlements(team_id):
+    cache.delete(_get_team_entitlements_cache_key(team_id))
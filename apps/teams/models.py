@@ -3,6 +3,7 @@ import uuid
 from django.conf import settings
 from django.db import models
 from django.urls import reverse
+from django.utils.functional import cached_property
 from django.utils.translation import gettext
 from waffle import get_setting
 from waffle.models import AbstractUserFlag, CACHE_EMPTY
@@ -57,6 +58,15 @@ class Team(BaseModel, SubscriptionModelBase):
     def has_active_subscription(self):
         return True if self.active_stripe_subscription else False
 
+    @cached_property
+    def entitlements(self):
+        """
+        Cached snapshot of the get_*_limit / get_allowed_* values, rebuilt when the subscription changes.
+        """
+        from .entitlements import get_team_entitlements
+
+        return get_team_entitlements(self)
+
     def get_user_limit(self):
         if not self.active_stripe_subscription:
             return 0
@@ -89,6 +99,11 @@ class Team(BaseModel, SubscriptionModelBase):
             return False
         return self.subscription.plan.product.metadata.get('allowed_api_access', '') == 'true'
 
+    def get_api_rate_limit(self):
+        if not self.active_stripe_subscription:
+            return settings.API_RATE_LIMIT_PER_MINUTE
+        return int(self.subscription.plan.product.metadata.get('api_rate_limit', settings.API_RATE_LIMIT_PER_MINUTE))
+
     def get_allowed_data_download(self):
         if not self.active_stripe_subscription:
             return False
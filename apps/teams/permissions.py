@@ -1,7 +1,7 @@
 from rest_framework import permissions
 from rest_framework.request import Request
 
-from .roles import is_admin, is_member
+from .roles import get_role_resolver
 from .models import Team
 from rest_framework.permissions import IsAdminUser
 
@@ -36,6 +36,7 @@ class TeamModelAccessPermissions(permissions.BasePermission):
 
 
 def _view_for_members_edit_for_admins(request: Request, team: Team):
+    roles = get_role_resolver(request)
     if request.method in permissions.SAFE_METHODS:
-        return is_member(request.user, team)
-    return is_admin(request.user, team)
+        return roles.is_member(team)
+    return roles.is_admin(team)
@@ -1,17 +1,22 @@
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save
 from django.dispatch import receiver
 from djstripe import signals as djstripe_signals
 from djstripe.enums import SubscriptionStatus
 from djstripe.models import Subscription, Product
+from apps.api.cache import invalidate_verified_api_keys
 from apps.api.models import TeamApiKey, TeamApiKeyStatus
 from apps.subscriptions.helpers import subscription_is_active
 from .cache import save_product_allowed_feeds_value, get_product_allowed_feeds_value
+from .entitlements import invalidate_team_entitlements, rebuild_team_entitlements
 from .models import Membership, Team
+from .roles import invalidate_team_roles
 from .utils import update_user_teams_on_auth0
 
 
 @receiver(post_save, sender=Membership)
 def membership_created_or_updated(sender, instance, created, **kwargs):
+    invalidate_team_roles(instance.user_id)
     if not created:
         return
     update_user_teams_on_auth0(instance.user_id)
@@ -19,13 +24,24 @@ def membership_created_or_updated(sender, instance, created, **kwargs):
 
 @receiver(post_delete, sender=Membership)
 def membership_deleted(sender, instance, **kwargs):
+    invalidate_team_roles(instance.user_id)
     update_user_teams_on_auth0(instance.user_id)
 
+
+@receiver(m2m_changed, sender=Team.members.through)
+def team_members_added(sender, instance, action, reverse, pk_set, **kwargs):
+    # members.add() bulk creates the memberships without a post_save, removals go through post_delete
+    if action != "post_add":
+        return
+    for user_id in [instance.pk] if reverse else pk_set:
+        invalidate_team_roles(user_id)
+
+
 @receiver(pre_save, sender=Subscription)
 def handle_subscription_pre_save(sender, signal, instance, **kwargs):
     old_instance = Subscription.objects.filter(id=instance.id).first()
     if not subscription_is_active(instance):
-        TeamApiKey.objects.filter(team__subscription__djstripe_id=instance.djstripe_id).update(status=TeamApiKeyStatus.BLOCKED)
+        block_team_api_keys(TeamApiKey.objects.filter(team__subscription__djstripe_id=instance.djstripe_id))
         return
     if not old_instance:
         return
@@ -35,7 +51,20 @@ def handle_subscription_pre_save(sender, signal, instance, **kwargs):
         return
     if old_allowed_api_access == new_allowed_api_access:
         return
-    TeamApiKey.objects.filter(team__subscription__djstripe_id=instance.djstripe_id).update(status=TeamApiKeyStatus.BLOCKED)
+    block_team_api_keys(TeamApiKey.objects.filter(team__subscription__djstripe_id=instance.djstripe_id))
+
+
+@receiver(post_save, sender=Subscription)
+def handle_subscription_post_save(sender, instance, **kwargs):
+    rebuild_team_entitlements(Team.objects.filter(subscription__djstripe_id=instance.djstripe_id))
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def handle_team_changed(sender, instance, **kwargs):
+    # the team may have been given a different subscription
+    invalidate_team_entitlements(instance.id)
+
 
 @receiver(pre_save, sender=Product)
 def handle_product_pre_save(sender, signal, instance, **kwargs):
@@ -44,6 +73,12 @@ def handle_product_pre_save(sender, signal, instance, **kwargs):
         return
     save_product_allowed_feeds_value(old_product.id, old_product.metadata.get('allowed_api_access'))
 
+
+@receiver(post_save, sender=Product)
+def rebuild_product_team_entitlements(sender, instance, **kwargs):
+    rebuild_team_entitlements(Team.objects.filter(subscription__plan__product__id=instance.id))
+
+
 @receiver(post_save, sender=Product)
 def handle_product_post_save(sender, signal, instance, **kwargs):
     if instance.metadata.get('allowed_api_access') == 'true':
@@ -58,4 +93,12 @@ def handle_product_post_save(sender, signal, instance, **kwargs):
         return
     active_subscriptions = Subscription.objects.filter(status=SubscriptionStatus.active, plan__product__id=instance.id)
     active_subscriptions_ids = [subscription.djstripe_id for subscription in active_subscriptions]
-    TeamApiKey.objects.filter(team__subscription_id__in=active_subscriptions_ids).update(status=TeamApiKeyStatus.BLOCKED)
+    block_team_api_keys(TeamApiKey.objects.filter(team__subscription_id__in=active_subscriptions_ids))
+
+
+def block_team_api_keys(team_api_keys):
+    # update() sends no signals, so the blocked keys are dropped from the verified key cache here,
+    # after the commit so that no request caches them again as active in the meantime
+    prefixes = list(team_api_keys.values_list('prefix', flat=True))
+    team_api_keys.update(status=TeamApiKeyStatus.BLOCKED)
+    transaction.on_commit(lambda: invalidate_verified_api_keys(prefixes))
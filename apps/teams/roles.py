@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+from django.conf import settings
+from django.core.cache import cache
+
 from apps.users.models import CustomUser
+from apps.utils.request_cache import get_request_cached
 
 ROLE_OWNER = "owner"
 ROLE_ADMIN = "admin"
 ROLE_MEMBER = "member"
 
+TEAM_ROLES_CACHE_KEY = "team.roles"
+
 ROLE_CHOICES = (
     # customize roles here
     (ROLE_OWNER, "Owner"),
@@ -43,4 +49,82 @@ def is_owner_by_user_id(user_id: str, team) -> bool:
 
     from .models import Membership
 
-    return Membership.objects.filter(team=team, user_id=user_id, role=ROLE_OWNER).exists()
\ No newline at end of file
+    return Membership.objects.filter(team=team, user_id=user_id, role=ROLE_OWNER).exists()
+
+
+def _get_team_roles_cache_key(user_id):
+    return f"{TEAM_ROLES_CACHE_KEY}:{user_id}"
+
+
+def get_cached_team_roles(user_id):
+    """
+    Returns the cached {team_id: role} mapping of the user, or None when there is none.
+    """
+    return cache.get(_get_team_roles_cache_key(user_id))
+
+
+def save_team_roles(user_id) -> dict:
+    from .models import Membership
+
+    roles = {
+        str(team_id): role
+        for team_id, role in Membership.objects.filter(user_id=user_id).values_list("team_id", "role")
+    }
+    cache.set(_get_team_roles_cache_key(user_id), roles, timeout=settings.TEAM_ROLES_CACHE_TIMEOUT)
+    return roles
+
+
+def invalidate_team_roles(user_id):
+    cache.delete(_get_team_roles_cache_key(user_id))
+
+
+class RoleResolver:
+    """
+    Looks up a user's role in any team from the cached roles of the user, or with a single query
+    when they are not cached, memoized for the life of the object.
+
+    Use `get_role_resolver` to share one resolver across everything that handles a request.
+    """
+
+    def __init__(self, user: CustomUser):
+        self.user_id = user.id if user and user.is_authenticated else None
+        self._roles = None
+
+    @property
+    def roles(self) -> dict:
+        if self._roles is None:
+            self._roles = {}
+            if self.user_id is not None:
+                self._roles = get_cached_team_roles(self.user_id)
+                if self._roles is None:
+                    self._roles = save_team_roles(self.user_id)
+        return self._roles
+
+    def clear(self):
+        # call after the user's memberships changed during the request
+        self._roles = None
+
+    def get_role(self, team):
+        if not team:
+            return None
+        return self.roles.get(str(team.id))
+
+    def is_member(self, team) -> bool:
+        return self.get_role(team) is not None
+
+    def is_admin(self, team) -> bool:
+        return self.get_role(team) in (ROLE_ADMIN, ROLE_OWNER)
+
+    def is_owner(self, team) -> bool:
+        return self.get_role(team) == ROLE_OWNER
+
+
+def get_role_resolver(request) -> RoleResolver:
+    user = request.user
+    user_id = user.id if user and user.is_authenticated else None
+    return get_request_cached(
+        request,
+        "team_role_resolver",
+        lambda: RoleResolver(user),
+        is_valid=lambda resolver: resolver.user_id == user_id,
+    )
@@ -7,10 +7,9 @@ from rest_framework.validators import UniqueValidator
 
 from apps.subscriptions.serializers import SubscriptionSerializer
 from .invitations import send_invitation, process_invitation
-from .roles import is_admin, is_member
+from .roles import get_role_resolver, is_member
 from .helpers import get_next_unique_team_slug
 from .models import Team, Membership, Invitation
-from .roles import is_admin, is_owner
 
 
 class MembershipSerializer(serializers.ModelSerializer):
@@ -70,10 +69,10 @@ class TeamSerializer(serializers.ModelSerializer):
         )
 
     def get_is_admin(self, obj) -> bool:
-        return is_admin(self.context["request"].user, obj)
+        return get_role_resolver(self.context["request"]).is_admin(obj)
 
     def get_is_owner(self, obj) -> bool:
-        return is_owner(self.context["request"].user, obj)
+        return get_role_resolver(self.context["request"]).is_owner(obj)
 
     def create(self, validated_data):
         team_name = validated_data.get("name", None)
@@ -0,0 +1,36 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.teams.entitlements import get_team_entitlements, invalidate_team_entitlements
+from apps.teams.models import Team
+
+
+@override_settings(
+    TEAM_ENTITLEMENTS_CACHE_TIMEOUT=60,
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class TeamEntitlementsTest(SimpleTestCase):
+    def get_team(self):
+        team = Team(name="Team")
+        team.get_user_limit = mock.Mock(return_value=5)
+        team.get_feed_limit = mock.Mock(return_value=10)
+        team.get_allowed_api_access = mock.Mock(return_value=True)
+        team.get_allowed_data_download = mock.Mock(return_value=False)
+        team.get_api_rate_limit = mock.Mock(return_value=120)
+        return team
+
+    @mock.patch("apps.teams.models.Team.has_active_subscription", True)
+    def test_snapshot_is_built_once(self):
+        team = self.get_team()
+        entitlements = get_team_entitlements(team)
+        self.assertTrue(entitlements.has_active_subscription)
+        self.assertEqual(entitlements.feed_limit, 10)
+        self.assertEqual(entitlements.user_limit, 5)
+
+        get_team_entitlements(team)
+        team.get_feed_limit.assert_called_once()
+
+        invalidate_team_entitlements(team.id)
+        get_team_entitlements(team)
+        self.assertEqual(team.get_feed_limit.call_count, 2)
@@ -1,7 +1,7 @@
 from django.test import TestCase
 
 from apps.teams.models import Team
-from apps.teams.roles import ROLE_ADMIN, is_admin, ROLE_MEMBER, is_member
+from apps.teams.roles import ROLE_ADMIN, is_admin, ROLE_MEMBER, is_member, RoleResolver
 from apps.users.models import CustomUser
 
 
@@ -27,3 +27,13 @@ class RoleTest(TestCase):
         self.assertFalse(is_admin(user, self.team2))
         self.assertTrue(is_member(user, self.team1))
         self.assertFalse(is_member(user, self.team2))
+
+    def test_role_resolver(self):
+        user = CustomUser.objects.create(email="user@example.com")
+        self.team1.members.add(user, through_defaults={"role": ROLE_ADMIN})
+        resolver = RoleResolver(user)
+        with self.assertNumQueries(1):
+            self.assertTrue(resolver.is_admin(self.team1))
+            self.assertFalse(resolver.is_owner(self.team1))
+            self.assertTrue(resolver.is_member(self.team1))
+            self.assertFalse(resolver.is_member(self.team2))
@@ -0,0 +1,50 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from djstripe.models import Subscription
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.subscriptions.metadata import ProductMetadata
+from apps.subscriptions.tests.utils import create_subscription_for_team
+from apps.teams.models import Team
+from apps.teams.roles import ROLE_OWNER
+from apps.teams.views.api_views import TeamViewSet
+from apps.users.models import CustomUser
+
+
+class TeamListQueriesTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username="user@example.com", email="user@example.com")
+
+    def add_team(self, index):
+        team = Team.objects.create(name=f"Team {index}", slug=f"team-{index}")
+        team.members.add(self.user, through_defaults={"role": ROLE_OWNER})
+        subscription = create_subscription_for_team(
+            team, ProductMetadata(stripe_id=f"prod_{index}", slug=f"product-{index}", name="Product", features=[])
+        )
+        # update() skips the Subscription receivers, which expect a plan on the saved subscription
+        plan = subscription.items.get().plan
+        Subscription.objects.filter(pk=subscription.pk).update(plan=plan)
+        product = plan.product
+        product.metadata = {"allowed_api_access": "true"}
+        product.save(update_fields=["metadata"])
+
+    def list_teams(self):
+        request = APIRequestFactory().get("/api/teams/")
+        force_authenticate(request, user=self.user)
+        response = TeamViewSet.as_view({"get": "list"})(request)
+        response.render()
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_queries_do_not_grow_with_the_number_of_teams(self):
+        self.add_team(1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.list_teams()
+        self.assertTrue(response.data["results"][0]["allowed_api_access"])
+
+        for index in range(2, 5):
+            self.add_team(index)
+        with self.assertNumQueries(len(queries)):
+            response = self.list_teams()
+        self.assertEqual(len(response.data["results"]), 4)
@@ -1,7 +1,8 @@
 from django.shortcuts import get_object_or_404
-from django.db.models import Count, Q
+from django.db.models import Count, Prefetch, Q
 from django.utils.translation import gettext_lazy as _
 from allauth.socialaccount.models import SocialAccount
+from djstripe.models import SubscriptionItem
 from drf_spectacular.utils import extend_schema, extend_schema_view
 from rest_framework import viewsets, mixins
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
@@ -27,7 +28,7 @@ from apps.users.views import (
 from ..invitations import send_invitation, process_invitation
 from ..models import Team, Invitation, Membership, TeamProfile
 from ..permissions import TeamAccessPermissions, TeamModelAccessPermissions
-from ..roles import ROLE_ADMIN, ROLE_OWNER, is_admin, is_member, is_owner, is_owner_by_user_id
+from ..roles import ROLE_ADMIN, ROLE_OWNER, get_role_resolver, is_admin, is_member, is_owner, is_owner_by_user_id
 from ..serializers import (
     MembershipSerializer,
     InvitationSerializer,
@@ -73,7 +74,10 @@ class TeamViewSet(viewsets.ModelViewSet):
         return self.request.user.teams.order_by("name")
 
     def get_queryset(self):
-        return self.get_queryset_data().select_related('subscription')
+        # everything TeamWithAllowedApiAccessSerializer reads, so listing teams costs the same for any number of teams
+        return self.get_queryset_data().select_related('subscription__plan__product').prefetch_related(
+            Prefetch('subscription__items', queryset=SubscriptionItem.objects.select_related('price__product'))
+        )
 
     def check_object_permissions(self, request, obj):
         if self.action not in ['list', 'subscribe', 'unsubscribe']:
@@ -88,6 +92,8 @@ class TeamViewSet(viewsets.ModelViewSet):
         # ensure logged in user is set on the model during creation
         team = serializer.save()
         team.members.add(self.request.user, through_defaults={"role": "owner"})
+        # the response shows the user's role in the new team
+        get_role_resolver(self.request).clear()
         update_user_teams_on_auth0(self.request.user.id)
         subscribe_team_to_initial_subscription(team)
 
@@ -257,7 +263,7 @@ class TeamInvitationViewSet(viewsets.ModelViewSet):
             raise PermissionDenied()
         team_user_count = Membership.objects.filter(team=team).count()
         team_invite_count = Invitation.objects.filter(team=team).count()
-        allowed_user_count = team.get_user_limit()
+        allowed_user_count = team.entitlements.user_limit
         if allowed_user_count and allowed_user_count < (team_user_count + team_invite_count):
             raise DRFValidationError({
                 "code": "E01",
@@ -277,7 +283,7 @@ class TeamInvitationViewSet(viewsets.ModelViewSet):
             raise PermissionDenied()
         team_user_count = Membership.objects.filter(team=team).count()
         team_invite_count = Invitation.objects.filter(team=team, is_cancelled=False, is_accepted=False).count()
-        allowed_user_count = team.get_user_limit()
+        allowed_user_count = team.entitlements.user_limit
         available_user_slot = allowed_user_count - (team_user_count + team_invite_count)
         if allowed_user_count and available_user_slot < len(serializer.validated_data):
             raise DRFValidationError({
@@ -375,7 +381,7 @@ class TeamApiKeyViewSet(viewsets.ModelViewSet):
     @property
     def team(self):
         team = get_object_or_404(Team, id=self.kwargs["team_id"])
-        if not team.get_allowed_api_access():
+        if not team.entitlements.allowed_api_access:
             raise DRFValidationError("Upgrade your subscription to be able to access the API")
         if self.request.user.is_staff or is_member(self.request.user, team):
             return team
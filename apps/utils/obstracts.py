@@ -1,11 +1,12 @@
-import requests
 from django.conf import settings
 
+from apps.obstracts_api import client
+
 OBSTRACT_SERVICE_API = settings.OBSTRACT_SERVICE_API
 
 
 def get_profile(profile_id):
-    response = requests.get(OBSTRACT_SERVICE_API+ '/profiles/')
+    response = client.get(OBSTRACT_SERVICE_API+ '/profiles/', endpoint='profiles')
     # print(response.json()['profiles'])
     data = response.json()['profiles']
     for item in data:
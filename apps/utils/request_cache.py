@@ -0,0 +1,13 @@
+def get_request_cached(request, name, factory, is_valid=None):
+    """
+    Returns the value stored under `name` for the request, built with `factory()` on first use.
+
+    Values are kept on the django HttpRequest, DRF wraps it in a new Request for every view it
+    passes through. A value rejected by `is_valid` is built again.
+    """
+    http_request = getattr(request, "_request", request)
+    values = http_request.__dict__.setdefault("_request_cache", {})
+    value = values.get(name)
+    if value is None or (is_valid is not None and not is_valid(value)):
+        value = values[name] = factory()
+    return value
@@ -0,0 +1,18 @@
+"""
+ASGI config for Obstracts Web project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with an ASGI server, e.g. ``gunicorn obstracts_web.asgi:application -k uvicorn.workers.UvicornWorker``,
+and set OBSTRACT_PROXY_ASYNC to serve the Obstracts proxy routes with the async views.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/stable/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "obstracts_web.settings")
+
+application = get_asgi_application()
@@ -27,4 +27,8 @@ app.conf.beat_schedule = {
         'task': 'apps.obstracts_api.tasks.sync_feed_updates',
         'schedule': timedelta(minutes=1),
     },
+    'flush_api_key_last_used': {
+        'task': 'apps.api.tasks.flush_api_key_last_used',
+        'schedule': timedelta(minutes=1),
+    },
 }
@@ -170,6 +170,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "obstracts_web.wsgi.application"
+ASGI_APPLICATION = "obstracts_web.asgi.application"
 
 FORM_RENDERER = "django.forms.renderers.TemplatesSetting"
 
@@ -376,6 +377,20 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 10,
 }
 
+# Token bucket limits of apps.api.throttling.TeamRateThrottle, in requests per minute. Teams get the
+# `api_rate_limit` metadata of their subscription product, or API_RATE_LIMIT_PER_MINUTE when unset.
+API_RATE_LIMIT_PER_MINUTE = env.int("API_RATE_LIMIT_PER_MINUTE", default=120)
+# how long a verified TeamApiKey is trusted without hashing it again
+API_KEY_CACHE_TIMEOUT = env.int("API_KEY_CACHE_TIMEOUT", default=300)
+# Team entitlement snapshots (apps/teams/entitlements.py) are rebuilt when subscriptions or products
+# change, the timeout only bounds how long a missed change can go unnoticed.
+TEAM_ENTITLEMENTS_CACHE_TIMEOUT = env.int("TEAM_ENTITLEMENTS_CACHE_TIMEOUT", default=60 * 60)
+# The team roles of a user (apps/teams/roles.py) are dropped when one of their memberships changes.
+TEAM_ROLES_CACHE_TIMEOUT = env.int("TEAM_ROLES_CACHE_TIMEOUT", default=60 * 60)
+# The redis sets of subscribed feeds per team (apps/obstracts_api/subscription_index.py) are kept up to
+# date by signals and rebuilt from the database after expiring, see also `manage.py rebuild_team_feed_index`.
+TEAM_FEED_INDEX_TTL = env.int("TEAM_FEED_INDEX_TTL", default=24 * 60 * 60)
+
 
 SPECTACULAR_SETTINGS = {
     "TITLE": "Obstracts Web",
@@ -497,6 +512,70 @@ INVITATION_URL = FRONTEND_BASE_URL + "/teams/invitation/"
 OBSTRACT_SERVICE_BASE_URL = env("OBSTRACT_SERVICE_BASE_URL", default="")
 OBSTRACT_SERVICE_API = OBSTRACT_SERVICE_BASE_URL + "/api/v1"
 
+# Connection pooling / timeouts for the shared Obstracts service client (apps/obstracts_api/client.py)
+OBSTRACT_SERVICE_POOL_CONNECTIONS = env.int("OBSTRACT_SERVICE_POOL_CONNECTIONS", default=10)
+OBSTRACT_SERVICE_POOL_MAXSIZE = env.int("OBSTRACT_SERVICE_POOL_MAXSIZE", default=20)
+OBSTRACT_SERVICE_CONNECT_TIMEOUT = env.float("OBSTRACT_SERVICE_CONNECT_TIMEOUT", default=5)
+OBSTRACT_SERVICE_READ_TIMEOUT = env.float("OBSTRACT_SERVICE_READ_TIMEOUT", default=60)
+# read timeouts per Obstracts endpoint, anything not listed uses OBSTRACT_SERVICE_READ_TIMEOUT
+OBSTRACT_SERVICE_READ_TIMEOUTS = env.dict(
+    "OBSTRACT_SERVICE_READ_TIMEOUTS",
+    cast={"value": float},
+    default={"feeds": 30, "jobs": 10, "posts": 15, "reports": 30, "objects": 30, "profiles": 10},
+)
+# Upper bound on concurrent connections held by each worker's httpx.AsyncClient (ASGI only)
+OBSTRACT_SERVICE_ASYNC_MAX_CONNECTIONS = env.int("OBSTRACT_SERVICE_ASYNC_MAX_CONNECTIONS", default=500)
+# posts of a page of reports are fetched with up to OBSTRACT_SERVICE_FANOUT_WORKERS concurrent requests,
+# keep it under OBSTRACT_SERVICE_POOL_MAXSIZE
+OBSTRACT_SERVICE_FANOUT_WORKERS = env.int("OBSTRACT_SERVICE_FANOUT_WORKERS", default=8)
+OBSTRACT_SERVICE_FANOUT_TIMEOUT = env.float("OBSTRACT_SERVICE_FANOUT_TIMEOUT", default=20)
+# posts fetched for reports are cached until a job of their feed finishes, or for at most this many seconds
+OBSTRACT_POST_CACHE_TTL = env.int("OBSTRACT_POST_CACHE_TTL", default=24 * 60 * 60)
+# Serve the latest posts from the local FeedPost index, synced when feed jobs finish. Backfill it with
+# `manage.py sync_feed_posts --full` before turning this on.
+OBSTRACT_LOCAL_POSTS = env.bool("OBSTRACT_LOCAL_POSTS", default=False)
+OBSTRACT_POST_SYNC_PAGE_SIZE = env.int("OBSTRACT_POST_SYNC_PAGE_SIZE", default=100)
+# latest posts read from the Obstracts service are cached under the hash of the team's feed set
+OBSTRACT_LATEST_POSTS_CACHE_TTL = env.int("OBSTRACT_LATEST_POSTS_CACHE_TTL", default=60)
+
+# Stream proxied Obstracts responses to the client as they arrive instead of buffering them
+OBSTRACT_PROXY_STREAMING = env.bool("OBSTRACT_PROXY_STREAMING", default=True)
+OBSTRACT_PROXY_CHUNK_SIZE = env.int("OBSTRACT_PROXY_CHUNK_SIZE", default=64 * 1024)
+# Route the proxy URLs to the async views. Only enable this when serving obstracts_web.asgi:application
+OBSTRACT_PROXY_ASYNC = env.bool("OBSTRACT_PROXY_ASYNC", default=False)
+
+# Seconds proxied GET responses stay fresh in the shared cache, per route (see ObstractsProxyView.cache_route).
+# Expired entries are kept for OBSTRACT_PROXY_CACHE_REVALIDATE_TTL more seconds so they can be revalidated.
+OBSTRACT_PROXY_CACHE_TTLS = env.dict(
+    "OBSTRACT_PROXY_CACHE_TTLS",
+    cast={"value": int},
+    default={"feeds": 60, "open_feeds": 60, "objects": 120, "object": 120},
+)
+OBSTRACT_PROXY_CACHE_REVALIDATE_TTL = env.int("OBSTRACT_PROXY_CACHE_REVALIDATE_TTL", default=600)
+# larger (still compressed) bodies are streamed to the client instead of being cached
+OBSTRACT_PROXY_CACHE_MAX_SIZE = env.int("OBSTRACT_PROXY_CACHE_MAX_SIZE", default=1024 * 1024)
+# How long past their TTL stale-while-revalidate routes may still answer from an entry while it is
+# refreshed in the background. Must not exceed OBSTRACT_PROXY_CACHE_REVALIDATE_TTL.
+OBSTRACT_PROXY_STALE_TTL = env.int("OBSTRACT_PROXY_STALE_TTL", default=300)
+OBSTRACT_PROXY_REFRESH_LOCK_TIMEOUT = env.int("OBSTRACT_PROXY_REFRESH_LOCK_TIMEOUT", default=60)
+
+# Coalesce identical concurrent proxied GETs into one upstream request.
+# "local" coalesces within a worker process, "redis" also across workers, "off" disables it.
+OBSTRACT_PROXY_COALESCE = env("OBSTRACT_PROXY_COALESCE", default="local")
+OBSTRACT_PROXY_COALESCE_TIMEOUT = env.float("OBSTRACT_PROXY_COALESCE_TIMEOUT", default=30)
+OBSTRACT_PROXY_COALESCE_POLL_INTERVAL = env.float("OBSTRACT_PROXY_COALESCE_POLL_INTERVAL", default=0.05)
+
+# Circuit breaker in front of the Obstracts service (apps/obstracts_api/breaker.py). It opens once
+# OBSTRACT_CIRCUIT_FAILURE_RATE of at least OBSTRACT_CIRCUIT_MINIMUM_CALLS calls in the last
+# OBSTRACT_CIRCUIT_WINDOW seconds failed, and lets a probe through after OBSTRACT_CIRCUIT_RESET_TIMEOUT seconds.
+OBSTRACT_CIRCUIT_BREAKER_ENABLED = env.bool("OBSTRACT_CIRCUIT_BREAKER_ENABLED", default=True)
+OBSTRACT_CIRCUIT_FAILURE_RATE = env.float("OBSTRACT_CIRCUIT_FAILURE_RATE", default=0.5)
+OBSTRACT_CIRCUIT_MINIMUM_CALLS = env.int("OBSTRACT_CIRCUIT_MINIMUM_CALLS", default=20)
+OBSTRACT_CIRCUIT_WINDOW = env.int("OBSTRACT_CIRCUIT_WINDOW", default=60)
+OBSTRACT_CIRCUIT_RESET_TIMEOUT = env.int("OBSTRACT_CIRCUIT_RESET_TIMEOUT", default=30)
+OBSTRACT_CIRCUIT_HALF_OPEN_CALLS = env.int("OBSTRACT_CIRCUIT_HALF_OPEN_CALLS", default=1)
+OBSTRACT_CIRCUIT_METRICS_TTL = env.int("OBSTRACT_CIRCUIT_METRICS_TTL", default=24 * 60 * 60)
+
 BREVO_KEY = env("BREVO_KEY", default="")
 
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"